@@ -0,0 +1,514 @@
+"""Oflayn benchmark: admin tugmalarini xotiradagi Firestore va soxta Telegram bot bilan o'lchash
+
+Har bir ro'yxat hajmi uchun PaymentBot ishga tushiriladi (post_init ham o'lchanadi), so'ng har bir
+tugma bir necha marta bosiladi. Hisobotda kechikish, Firestore so'rovlari / o'qishlar / yozuvlar
+va tracemalloc bo'yicha eng yuqori xotira ko'rsatiladi.
+
+Kechikishdan soxta Firestorening o'z CPU vaqti (indekssiz filtrlash va saralash) ayirib tashlanadi,
+Firestore tomoni faqat --latency / --per-doc bilan berilgan tarmoq kechikishi sifatida hisoblanadi.
+
+Ishlatish:
+    python benchmark.py
+    python benchmark.py --sizes 5000 --latency 20 --repeat 3
+    python benchmark.py --roster          # ROSTER_CACHE=1 rejimi
+"""
+import os
+import time
+import math
+import random
+import asyncio
+import logging
+import argparse
+import threading
+import tracemalloc
+from statistics import median
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+
+# Scheduler vazifalari diskka yozilmasin (main import qilinishidan oldin)
+os.environ.setdefault("SCHEDULER_DB_URL", "sqlite://")
+
+from firebase_admin import firestore
+
+import main
+
+
+class FakeSnapshot:
+    """Firestore DocumentSnapshot o'rnini bosuvchi"""
+
+    def __init__(self, doc_id, data, fields=None):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+        self._fields = fields
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        if self._fields:
+            return {field: self._data[field] for field in self._fields if field in self._data}
+        return dict(self._data)
+
+
+class FakeDocument:
+    def __init__(self, client, collection, doc_id):
+        self.client = client
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self):
+        self.client._rpc(reads=1)
+        return FakeSnapshot(self.id, self.client.data[self.collection].get(self.id))
+
+    def set(self, data, merge=False):
+        self.client._rpc(writes=1)
+        self.client._apply(self.collection, self.id, data, merge)
+
+    def update(self, fields):
+        self.client._rpc(writes=1)
+        self.client._apply(self.collection, self.id, fields, True)
+
+
+def _sort_key(value):
+    # Firestore tartibida null qiymatlar birinchi keladi
+    return (value is not None, value)
+
+
+def _matches(value, op, expected):
+    if op == "==":
+        return value == expected
+    if op == "in":
+        return value in expected
+    if value is None:
+        return False
+    try:
+        if op == "<":
+            return value < expected
+        if op == "<=":
+            return value <= expected
+        if op == ">":
+            return value > expected
+        if op == ">=":
+            return value >= expected
+    except TypeError:
+        return False
+    raise ValueError(f"Qo'llab-quvvatlanmaydigan operator: {op}")
+
+
+class FakeQuery:
+    """Kod ishlatadigan so'rov imkoniyatlari: where, order_by, limit, kursorlar, select, count"""
+
+    def __init__(self, client, collection, **state):
+        self.client = client
+        self.collection = collection
+        self.filters = state.get("filters", ())
+        self.orders = state.get("orders", ())
+        self.limit_count = state.get("limit_count")
+        self.limit_last = state.get("limit_last", False)
+        self.cursor_after = state.get("cursor_after")
+        self.cursor_before = state.get("cursor_before")
+        self.fields = state.get("fields")
+
+    def _copy(self, **changes):
+        state = dict(
+            filters=self.filters, orders=self.orders, limit_count=self.limit_count,
+            limit_last=self.limit_last, cursor_after=self.cursor_after,
+            cursor_before=self.cursor_before, fields=self.fields
+        )
+        state.update(changes)
+        return FakeQuery(self.client, self.collection, **state)
+
+    def document(self, doc_id):
+        return FakeDocument(self.client, self.collection, doc_id)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self.filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self.orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit_count=count, limit_last=False)
+
+    def limit_to_last(self, count):
+        return self._copy(limit_count=count, limit_last=True)
+
+    def start_after(self, values):
+        return self._copy(cursor_after=values)
+
+    def end_before(self, values):
+        return self._copy(cursor_before=values)
+
+    def select(self, fields):
+        return self._copy(fields=tuple(fields))
+
+    def count(self):
+        return FakeAggregation(self)
+
+    def on_snapshot(self, callback):
+        return self.client._watch(self.collection, callback)
+
+    def _cursor_key(self, values):
+        return tuple(_sort_key(values.get(field)) for field, _ in self.orders)
+
+    def _sorted(self):
+        """Kolleksiya shu tartibda (keshlanadi - Firestore indeksiga o'xshab, yozuvgacha amal qiladi)"""
+        key = (self.collection, self.orders)
+        version = self.client.versions[self.collection]
+        cached = self.client._indexes.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # Ko'rsatilgan tartib, so'ng hujjat ID si bo'yicha
+        items = sorted(self.client.data[self.collection].items(), key=lambda item: item[0])
+        for field, direction in reversed(self.orders):
+            items.sort(key=lambda item: _sort_key(item[1].get(field)), reverse=direction == "DESCENDING")
+        self.client._indexes[key] = (version, items)
+        return items
+
+    def _matching(self):
+        items = self._sorted()
+        if not self.filters:
+            return items
+        return [
+            item for item in items
+            if all(field in item[1] and _matches(item[1][field], op, value) for field, op, value in self.filters)
+        ]
+
+    def _run(self):
+        items = self._matching()
+        start, end = 0, len(items)
+        if self.cursor_after is not None:
+            cursor = self._cursor_key(self.cursor_after)
+            start = next((i for i in range(start, end) if self._cursor_key(items[i][1]) > cursor), end)
+        if self.cursor_before is not None:
+            cursor = self._cursor_key(self.cursor_before)
+            end = next((i for i in range(start, end) if self._cursor_key(items[i][1]) >= cursor), end)
+        if self.limit_count is not None:
+            if self.limit_last:
+                start = max(start, end - self.limit_count)
+            else:
+                end = min(end, start + self.limit_count)
+        return items[start:end]
+
+    def stream(self):
+        started = time.thread_time()
+        items = self._run()
+        self.client._overhead(time.thread_time() - started)
+        self.client._rpc(reads=max(1, len(items)), docs=len(items))
+        return iter([FakeSnapshot(doc_id, data, self.fields) for doc_id, data in items])
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeAggregation:
+    def __init__(self, query):
+        self.query = query
+
+    def get(self):
+        # Aggregation: har 1000 ta indeks yozuviga bitta o'qish
+        started = time.thread_time()
+        count = len(self.query._matching())
+        self.query.client._overhead(time.thread_time() - started)
+        self.query.client._rpc(reads=max(1, math.ceil(count / 1000)))
+        return [[SimpleNamespace(value=count)]]
+
+
+class FakeBatch:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    def set(self, ref, data, merge=False):
+        self.ops.append((ref, data, merge))
+
+    def update(self, ref, fields):
+        self.ops.append((ref, fields, True))
+
+    def commit(self):
+        self.client._rpc(writes=len(self.ops))
+        for ref, data, merge in self.ops:
+            self.client._apply(ref.collection, ref.id, data, merge)
+        self.ops = []
+
+
+class FakeFirestore:
+    """Xotiradagi Firestore: o'qish/yozuvlarni sanaydi va har bir so'rovga kechikish qo'shadi"""
+
+    def __init__(self, latency=0.0, per_doc=0.0):
+        self.latency = latency
+        self.per_doc = per_doc
+        self.data = {"students": {}, "groups": {}, "payments": {}, "payment_stats": {}}
+        self.versions = dict.fromkeys(self.data, 0)
+        self._indexes = {}
+        self._watches = {}
+        self._ids = 0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.rpcs = 0
+        self.reads = 0
+        self.writes = 0
+        self.overhead = 0.0
+
+    def _overhead(self, seconds):
+        with self._lock:
+            self.overhead += seconds
+
+    def _rpc(self, reads=0, writes=0, docs=0):
+        with self._lock:
+            self.rpcs += 1
+            self.reads += reads
+            self.writes += writes
+        delay = self.latency + docs * self.per_doc
+        if delay:
+            time.sleep(delay)
+
+    def _apply(self, collection, doc_id, data, merge):
+        with self._lock:
+            store = self.data[collection]
+            current = dict(store.get(doc_id) or {}) if merge else {}
+            for field, value in data.items():
+                if isinstance(value, firestore.Increment):
+                    value = current.get(field, 0) + value.value
+                current[field] = value
+            store[doc_id] = current
+            self.versions[collection] += 1
+        self._notify(collection, [FakeSnapshot(doc_id, current)], "MODIFIED")
+
+    def _watch(self, collection, callback):
+        docs = [FakeSnapshot(doc_id, data) for doc_id, data in self.data[collection].items()]
+        self._rpc(reads=max(1, len(docs)))
+        watches = self._watches.setdefault(collection, [])
+        watches.append(callback)
+        callback(docs, [SimpleNamespace(type=SimpleNamespace(name="ADDED"), document=doc) for doc in docs], None)
+        return SimpleNamespace(unsubscribe=lambda: watches.remove(callback))
+
+    def _notify(self, collection, docs, change_type):
+        callbacks = self._watches.get(collection)
+        if not callbacks:
+            return
+        snapshot = [FakeSnapshot(doc_id, data) for doc_id, data in self.data[collection].items()]
+        changes = [SimpleNamespace(type=SimpleNamespace(name=change_type), document=doc) for doc in docs]
+        for callback in list(callbacks):
+            callback(snapshot, changes, None)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def get_all(self, refs, field_paths=None):
+        refs = list(refs)
+        self._rpc(reads=len(refs), docs=len(refs))
+        return [
+            FakeSnapshot(ref.id, self.data[ref.collection].get(ref.id), field_paths)
+            for ref in refs
+        ]
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, name):
+        super().__init__(client, name)
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            with self.client._lock:
+                self.client._ids += 1
+                doc_id = f"auto{self.client._ids:08d}"
+        return FakeDocument(self.client, self.collection, doc_id)
+
+
+class FakeBot:
+    """Telegram Bot o'rnini bosuvchi: faqat chaqiruvlarni sanaydi"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+        return SimpleNamespace(chat_id=chat_id, text=text)
+
+    async def get_chat(self, chat_id):
+        self.sent += 1
+        return SimpleNamespace(id=chat_id, username=f"user{chat_id}")
+
+
+class FakeMessage:
+    def __init__(self, bot, text):
+        self.bot = bot
+        self.text = text
+
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        self.bot.sent += 1
+
+    async def reply_document(self, document, filename=None, caption=None, **kwargs):
+        document.read()
+        self.bot.sent += 1
+
+
+def fake_update(bot, text):
+    return SimpleNamespace(
+        effective_user=SimpleNamespace(id=main.ADMIN_ID),
+        effective_chat=SimpleNamespace(id=main.ADMIN_ID, type="private"),
+        message=FakeMessage(bot, text)
+    )
+
+
+def seed(client, size, rng):
+    """Tasodifiy (lekin takrorlanadigan) o'quvchilar, guruhlar va oylik yig'malar"""
+    now = datetime.now(timezone.utc)
+    group_ids = [-1001000000000 - i for i in range(max(2, size // 250))]
+    for number, group_id in enumerate(group_ids, 1):
+        client.data["groups"][str(group_id)] = {
+            "group_id": group_id, "title": f"Guruh {number}", "added_date": now
+        }
+        month = main.payment_month(now)
+        client.data["payment_stats"][f"{month}_{group_id}"] = {
+            "month": month, "group_id": group_id,
+            "count": rng.randint(0, 50), "days": rng.randint(0, 1500)
+        }
+
+    for user_id in rng.sample(range(100000000, 999999999), size):
+        next_payment = None
+        if rng.random() < 0.9:
+            next_payment = now + timedelta(days=rng.randint(-30, 60), hours=rng.randint(0, 23))
+        if next_payment is None:
+            status = "active"
+        else:
+            # Muddati o'tganlar allaqachon eslatilgan (post_init darhol yubormasin)
+            status = "overdue" if next_payment < now else "paid"
+        client.data["students"][str(user_id)] = {
+            "user_id": user_id,
+            "name": f"O'quvchi {user_id}",
+            "phone": f"+99890{user_id % 10000000:07d}",
+            "username": f"user{user_id}" if rng.random() < 0.7 else None,
+            "group_id": rng.choice(group_ids),
+            "last_payment": next_payment - timedelta(days=30) if next_payment else None,
+            "next_payment": next_payment,
+            "payment_days": 30 if next_payment else None,
+            "added_date": now - timedelta(days=rng.randint(0, 365)),
+            "status": status
+        }
+
+
+BUTTONS = (
+    "➕ O'quvchi qo'shish",
+    "💰 To'lov belgilash",
+    "📋 O'quvchilar ro'yxati",
+    "⏰ Qolgan kunlar",
+    "📨 Guruhga to'lovlarni eslatish",
+    "📊 Statistika",
+    "📱 Guruhlar ro'yxati",
+    "📤 Eksport",
+    "⚙️ Joriy guruhni o'rnatish",
+)
+
+# Tugmadan keyingi qadam bilan birga o'lchanadigan ssenariylar
+FLOWS = (
+    ("📨 → 0 (barcha guruhlar)", ("📨 Guruhga to'lovlarni eslatish", "0")),
+)
+
+
+async def run_flow(bot, fake_bot, texts):
+    context = SimpleNamespace(user_data={}, bot=fake_bot)
+    # Har bir o'lchov yangi tezlik cheklovchisi bilan (oldingi o'lchovdagi chat oraliqlari kutilmaydi)
+    bot.broadcaster = main.Broadcaster(fake_bot)
+    for text in texts:
+        update = fake_update(fake_bot, text)
+        if text in BUTTONS:
+            await bot.handle_button_text(update, context)
+        else:
+            await bot.handle_message(update, context)
+
+
+async def measure(client, fake_bot, action, repeat):
+    """(kechikishlar, so'rovlar, o'qishlar, yozuvlar, xabarlar, eng yuqori xotira)"""
+    await action()  # qizdirish (keshlar va statistika)
+
+    latencies = []
+    for _ in range(repeat):
+        client.reset()
+        fake_bot.sent = 0
+        started = time.perf_counter()
+        await action()
+        latencies.append(time.perf_counter() - started - client.overhead)
+    counters = (client.rpcs, client.reads, client.writes, fake_bot.sent)
+
+    # Xotira alohida o'lchanadi - tracemalloc kechikishni buzmasligi uchun
+    tracemalloc.start()
+    await action()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (latencies, *counters, peak)
+
+
+def format_row(name, latencies, rpcs, reads, writes, sent, peak):
+    return (
+        f"{name:<34}{median(latencies) * 1000:>9.1f}{max(latencies) * 1000:>9.1f}"
+        f"{rpcs:>7}{reads:>9}{writes:>8}{sent:>7}{peak / 1024:>11.0f}"
+    )
+
+
+async def run_size(size, args):
+    rng = random.Random(args.seed)
+    client = FakeFirestore(args.latency / 1000, args.per_doc / 1_000_000)
+    seed(client, size, rng)
+
+    main.ROSTER_CACHE = args.roster
+    fake_bot = FakeBot()
+    bot = main.payment_bot = main.PaymentBot(client)
+
+    roster = "ha" if args.roster else "yo'q"
+    print(
+        f"\n=== {size} o'quvchi, {len(client.data['groups'])} guruh, "
+        f"{args.latency:g} ms/so'rov, roster keshi: {roster} ==="
+    )
+    print(
+        "tugma".ljust(34) + "p50 ms".rjust(9) + "max ms".rjust(9) + "RPC".rjust(7)
+        + "o'qish".rjust(9) + "yozuv".rjust(8) + "xabar".rjust(7) + "xotira KB".rjust(11)
+    )
+
+    # Ishga tushish bir marta o'lchanadi
+    client.reset()
+    tracemalloc.start()
+    started = time.perf_counter()
+    await bot.post_init(SimpleNamespace(bot=fake_bot))
+    elapsed = time.perf_counter() - started - client.overhead
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Tiklangan eslatmalar o'lchov paytida ishga tushmasin
+    bot.scheduler.pause()
+    print(format_row("post_init", [elapsed], client.rpcs, client.reads, client.writes, fake_bot.sent, peak))
+
+    scenarios = [(button, (button,)) for button in BUTTONS] + list(FLOWS)
+    try:
+        for name, texts in scenarios:
+            result = await measure(client, fake_bot, lambda: run_flow(bot, fake_bot, texts), args.repeat)
+            latencies, rpcs, reads, writes, sent, peak = result
+            print(format_row(name, latencies, rpcs, reads, writes, sent, peak))
+    finally:
+        await bot.post_shutdown(None)
+
+
+async def run(args):
+    for size in args.sizes:
+        await run_size(size, args)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PaymentBot admin tugmalari benchmarki")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="o'quvchilar soni")
+    parser.add_argument("--repeat", type=int, default=5, help="har bir tugma necha marta o'lchanadi")
+    parser.add_argument("--latency", type=float, default=5.0, help="har bir Firestore so'roviga kechikish (ms)")
+    parser.add_argument("--per-doc", type=float, default=10.0, help="har bir qaytgan hujjatga qo'shimcha (mikrosekund)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--roster", action="store_true", help="ROSTER_CACHE=1 rejimida o'lchash")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(run(parse_args()))
@@ -1,8 +1,21 @@
 import os
+import sys
+import csv
 import json
+import time
+import tempfile
+import threading
+import contextvars
+from bisect import bisect_left, bisect_right, insort
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -10,11 +23,11 @@ from telegram.ext import (
     ContextTypes,
     MessageHandler,
     filters,
-    ConversationHandler
+    ConversationHandler,
+    BaseUpdateProcessor
 )
-import firebase_admin
-from firebase_admin import credentials, firestore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.jobstores.memory import MemoryJobStore
 from dotenv import load_dotenv
 
 # .env faylini yuklash
@@ -27,44 +40,1545 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Firebase sozlamalari environment variable orqali
-firebase_json = os.getenv("FIREBASE_SERVICE_ACCOUNT")
-if not firebase_json:
-    logger.error("❌ FIREBASE_SERVICE_ACCOUNT topilmadi! .env faylini tekshiring.")
-    exit(1)
+# Admin ID
+ADMIN_ID = 1685356708
+
+# Firestore so'rovlari uchun cheklangan thread pool
+FIRESTORE_WORKERS = int(os.getenv("FIRESTORE_WORKERS", "8"))
+firestore_executor = ThreadPoolExecutor(max_workers=FIRESTORE_WORKERS, thread_name_prefix="firestore")
+
+# Guruhlar keshining yashash muddati (soniya)
+GROUP_CACHE_TTL = int(os.getenv("GROUP_CACHE_TTL", "300"))
+
+# Statistika kategoriyalarini qayta hisoblash oralig'i (daqiqa)
+STATS_ROLLOVER_MINUTES = int(os.getenv("STATS_ROLLOVER_MINUTES", "60"))
+
+# Eslatma vazifalari saqlanadigan baza (qayta ishga tushishda yo'qolmaydi)
+SCHEDULER_DB_URL = os.getenv("SCHEDULER_DB_URL", "sqlite:///jobs.sqlite")
+
+# Eslatma rejimi: "jobs" - har bir o'quvchiga alohida vazifa, "sweep" - davriy tekshiruv
+REMINDER_MODE = os.getenv("REMINDER_MODE", "jobs")
+SWEEP_INTERVAL_MINUTES = int(os.getenv("SWEEP_INTERVAL_MINUTES", "5"))
+
+# "jobs" rejimida bir vaqtda ishlagan eslatmalar shu oraliqda bitta hisobotga yig'iladi (soniya)
+REMINDER_REPORT_DELAY = int(os.getenv("REMINDER_REPORT_DELAY", "30"))
 
-try:
-    cred_dict = json.loads(firebase_json)
-    cred = credentials.Certificate(cred_dict)
+# Guruhlarga avtomatik kunlik eslatma vaqti ("HH:MM", bo'sh bo'lsa o'chirilgan)
+GROUP_REMINDER_TIME = os.getenv("GROUP_REMINDER_TIME", "")
+REMINDER_TIMEZONE = os.getenv("REMINDER_TIMEZONE", "Asia/Tashkent")
+LOCAL_TIMEZONE = ZoneInfo(REMINDER_TIMEZONE)
+
+# Telegram cheklovlari: umumiy ~30 xabar/soniya, bitta chatga ~1/soniya, guruhga 20/daqiqa
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+BROADCAST_RETRIES = 3
+PRIVATE_CHAT_INTERVAL = 1.0
+GROUP_CHAT_INTERVAL = 3.0
+
+# Telegram xabar uzunligi chegarasi (emoji uchun zaxira bilan) va sahifa hajmi
+MESSAGE_LIMIT = 4000
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "20"))
+
+# "Qolgan kunlar" ekranida ko'rsatiladigan eng yaqin muddatlar soni
+DAYS_REMAINING_LIMIT = int(os.getenv("DAYS_REMAINING_LIMIT", "50"))
+
+# Hisobotlar uchun Firestoredan bir martada o'qiladigan hujjatlar soni
+STREAM_BATCH = int(os.getenv("STREAM_BATCH", "300"))
+
+# Fayldan import ustunlari
+IMPORT_COLUMNS = ("name", "phone", "user_id", "group_id")
+
+# Usernamelarni fonda yangilash: tezlik, parallel so'rovlar, kesh muddati va oraliq
+USERNAME_RATE = float(os.getenv("USERNAME_RATE", "10"))
+USERNAME_CONCURRENCY = int(os.getenv("USERNAME_CONCURRENCY", "5"))
+USERNAME_CACHE_TTL = int(os.getenv("USERNAME_CACHE_TTL", "86400"))
+USERNAME_REFRESH_HOURS = int(os.getenv("USERNAME_REFRESH_HOURS", "24"))
+
+# Eksport faylidagi ustunlar
+EXPORT_COLUMNS = (
+    "user_id", "name", "phone", "username", "group_id", "group_title",
+    "status", "last_payment", "next_payment", "payment_days", "days_left", "added_date"
+)
+
+# To'lov muddati chegaralari (kun)
+MIN_PAYMENT_DAYS = 1
+MAX_PAYMENT_DAYS = 3650
+
+# Firestore bitta batchdagi maksimal yozuvlar soni
+BATCH_LIMIT = 500
+
+# O'quvchilar va guruhlarni xotirada saqlash (Firestore on_snapshot orqali yangilanadi)
+ROSTER_CACHE = os.getenv("ROSTER_CACHE", "0") == "1"
+# Tinglovchilar holatini tekshirish oralig'i (sekund) - to'xtagan bo'lsa qayta ulanadi
+ROSTER_CHECK_SECONDS = int(os.getenv("ROSTER_CHECK_SECONDS", "60"))
+
+# Webhook rejimi (WEBHOOK_URL bo'sh bo'lsa long polling ishlatiladi)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+
+# Bot API manzili (lokal sinov serveri yoki o'z Bot API serveri uchun)
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")
+TELEGRAM_BASE_FILE_URL = os.getenv("TELEGRAM_BASE_FILE_URL", "https://api.telegram.org/file/bot")
+
+# Bir vaqtda qayta ishlanadigan updatelar soni (bitta chat ichida tartib saqlanadi)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "32"))
+
+# Prometheus formatidagi metrikalar manzili (METRICS_PORT=0 - o'chirilgan)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Handler kechikishi gistogrammasi chegaralari (soniya)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Handler turi -> Telegramdan olinadigan update turlari
+HANDLER_UPDATE_TYPES = {
+    CommandHandler: (Update.MESSAGE,),
+    MessageHandler: (Update.MESSAGE,),
+    CallbackQueryHandler: (Update.CALLBACK_QUERY,),
+}
+
+# Timestamp filtrlari uchun (None qiymatlarni chiqarib tashlaydi)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def init_firestore():
+    """Firebase ni ishga tushirib Firestore klientini qaytarish (firebase_admin shu yerda import qilinadi)"""
+    firebase_json = os.getenv("FIREBASE_SERVICE_ACCOUNT")
+    if not firebase_json:
+        raise RuntimeError("FIREBASE_SERVICE_ACCOUNT topilmadi! .env faylini tekshiring.")
+    
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    
+    cred = credentials.Certificate(json.loads(firebase_json))
     firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    logger.info("✅ Firebase ulanishi muvaffaqiyatli amalga oshirildi.")
-except Exception as e:
-    logger.error(f"❌ Firebase ulanishida xato: {e}")
-    exit(1)
+    return firestore.client()
 
-# Bot tokeni
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-if not BOT_TOKEN:
-    logger.error("❌ BOT_TOKEN topilmadi! .env faylini tekshiring.")
-    exit(1)
 
-# Shu yerdan keyingi kodlaringiz o'zgarmaydi
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
 
 
-# Admin ID
-ADMIN_ID = 1685356708
+class Metrics:
+    """Hisoblagichlar, gauge va gistogrammalar (Prometheus matn formatida, faqat stdlib)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}     # (nom, yorliqlar) -> qiymat
+        self._gauges = {}
+        self._histograms = {}   # (nom, yorliqlar) -> [har bir chegara..., +Inf, yig'indi]
+        self.collectors = []    # /metrics so'ralganda gauge larni yangilaydigan async funksiyalar
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            counts = self._histograms.get(key)
+            if counts is None:
+                counts = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for kind, series in (("counter", self._counters), ("gauge", self._gauges)):
+                previous = None
+                for (name, labels), value in sorted(series.items()):
+                    if name != previous:
+                        lines.append(f"# TYPE {name} {kind}")
+                        previous = name
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            
+            previous = None
+            for (name, labels), counts in sorted(self._histograms.items()):
+                if name != previous:
+                    lines.append(f"# TYPE {name} histogram")
+                    previous = name
+                total = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    total += count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {total}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {counts[-1]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {total}")
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host, port):
+        """/metrics uchun oddiy HTTP server"""
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while await asyncio.wait_for(reader.readline(), 5) not in (b"\r\n", b"\n", b""):
+                pass
+            
+            if request.split()[1:2] == [b"/metrics"]:
+                for collect in self.collectors:
+                    try:
+                        await collect()
+                    except Exception as e:
+                        logger.error(f"Metrikalarni yig'ishda xato: {e}")
+                status, body = "200 OK", self.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+metrics = Metrics()
+
+# Joriy handler nomi (Firestore o'qish/yozuvlari shu nom bilan sanaladi)
+current_handler = contextvars.ContextVar("current_handler", default="background")
+
+
+@contextmanager
+def track(handler):
+    """Handler kechikishini o'lchash va ichidagi Firestore so'rovlarini shu nomga yozish"""
+    token = current_handler.set(handler)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.inc("handler_errors_total", handler=handler)
+        raise
+    finally:
+        metrics.observe("handler_latency_seconds", time.perf_counter() - started, handler=handler)
+        current_handler.reset(token)
+
+
+def tracked(handler):
+    """Butun metod uchun track() dekoratori"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with track(handler):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_reads(amount):
+    metrics.inc("firestore_reads_total", amount, handler=current_handler.get())
+
+
+def count_writes(amount):
+    metrics.inc("firestore_writes_total", amount, handler=current_handler.get())
+
+
+async def run_db(func, *args, **kwargs):
+    """Sinxron Firestore chaqiruvini event loopni bloklamasdan bajarish (handler nomi bilan)"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(firestore_executor, partial(context.run, func, *args, **kwargs))
+
+
+def _to_dicts(query):
+    """So'rov natijalarini lug'atlar ro'yxatiga aylantirish"""
+    result = [doc.to_dict() for doc in query.stream()]
+    count_reads(max(1, len(result)))
+    return result
+
+
+def _to_students(query, fields=None):
+    """So'rov natijalarini Student obyektlariga aylantirish (fields - proyeksiya)"""
+    if fields:
+        query = query.select(fields)
+    result = [Student.from_snapshot(doc) for doc in query.stream()]
+    count_reads(max(1, len(result)))
+    return result
+
+
+def _to_groups(query):
+    """So'rov natijalarini Group obyektlariga aylantirish"""
+    result = [Group.from_snapshot(doc) for doc in query.stream()]
+    count_reads(max(1, len(result)))
+    return result
+
+
+def _count(query):
+    """Server tomonida hisoblash (hujjatlarni yuklamasdan)"""
+    result = query.count().get()
+    value = result[0][0].value
+    # Aggregation: har 1000 ta indeks yozuviga bitta o'qish
+    count_reads(max(1, -(-value // 1000)))
+    return value
+
+
+class MessageStream:
+    """Qatorlarni yig'ib, chegaraga yetganda alohida xabar sifatida yuborish"""
+
+    def __init__(self, send, limit=MESSAGE_LIMIT):
+        self.send = send
+        self.limit = limit
+        self.sent = 0
+        self._parts = []
+        self._size = 0
+
+    async def write(self, text):
+        """Matn bo'lagini qo'shish (bo'lak ikki xabarga bo'linmaydi)"""
+        if self._parts and self._size + len(text) > self.limit:
+            await self.flush()
+        self._parts.append(text)
+        self._size += len(text)
+
+    async def flush(self):
+        if not self._parts:
+            return
+        await self.send("".join(self._parts))
+        self.sent += 1
+        self._parts = []
+        self._size = 0
+
+
+def _cell(value):
+    """Jadval katagini matnga aylantirish (Excel 123.0 -> "123")"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def read_roster_rows(path, filename):
+    """CSV yoki XLSX fayl qatorlarini lug'at sifatida oqim bilan o'qish"""
+    if filename.lower().endswith(".xlsx"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("Excel fayllar uchun openpyxl o'rnatilmagan, CSV yuboring")
+        
+        workbook = load_workbook(path, read_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_cell(value).lower() for value in next(rows, ())]
+            for row in rows:
+                yield {key: _cell(value) for key, value in zip(header, row)}
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                yield {(key or "").strip().lower(): _cell(value) for key, value in row.items()}
+
+
+def parse_import_row(row, group_titles, now):
+    """Import qatorini tekshirish: (user_id, o'quvchi ma'lumoti), xato bo'lsa ValueError"""
+    missing = [column for column in IMPORT_COLUMNS if not row.get(column)]
+    if missing:
+        raise ValueError(f"to'ldirilmagan: {', '.join(missing)}")
+    try:
+        user_id = int(row["user_id"])
+        group_id = int(row["group_id"])
+    except ValueError:
+        raise ValueError("user_id va group_id faqat raqam bo'lishi kerak")
+    if group_id not in group_titles:
+        raise ValueError(f"guruh topilmadi ({group_id})")
+    
+    return user_id, {
+        "user_id": user_id,
+        "name": row["name"],
+        "phone": row["phone"],
+        "username": None,
+        "group_id": group_id,
+        "last_payment": None,
+        "next_payment": None,
+        "added_date": now,
+        "status": "active"
+    }
+
+
+def export_row(student, group_titles, now):
+    """O'quvchi ma'lumotini eksport qatoriga aylantirish"""
+    def fmt(value):
+        return value.strftime('%d.%m.%Y') if value else ""
+    
+    days_left = student.days_left(now)
+    return [
+        student.user_id,
+        student.name or "",
+        student.phone or "",
+        student.username or "",
+        student.group_id or "",
+        group_titles.get(student.group_id, ""),
+        student.status or "",
+        fmt(student.last_payment),
+        student.next_date or "",
+        student.payment_days or "",
+        "" if days_left is None else days_left,
+        fmt(student.added_date)
+    ]
+
+
+def payment_fields(days, now):
+    """To'lov belgilanganda o'quvchi hujjatiga yoziladigan maydonlar"""
+    return {
+        "last_payment": now,
+        "next_payment": now + timedelta(days=days),
+        "payment_days": days,
+        "status": "paid"
+    }
+
+
+def payment_bucket(next_payment, now):
+    """To'lov holati kategoriyasi (to'lov belgilanmagan bo'lsa None)"""
+    if not next_payment:
+        return None
+    days_left = (next_payment - now).days
+    if days_left < 0:
+        return "overdue"
+    elif days_left == 0:
+        return "today"
+    elif days_left <= 7:
+        return "week"
+    return "paid"
+
+
+def payment_month(moment):
+    """Oylik yig'ma kaliti ("YYYY-MM") - mahalliy vaqt bo'yicha (REMINDER_TIMEZONE)"""
+    return moment.astimezone(LOCAL_TIMEZONE).strftime('%Y-%m')
+
+
+class PaymentStats:
+    """To'lov holatlari bo'yicha xotirada saqlanadigan yig'ma statistika"""
+
+    BUCKETS = ("paid", "week", "today", "overdue")
 
-class PaymentBot:
     def __init__(self):
-        self.scheduler = None
+        self._next_payments = {}
+        self._buckets = {}
+        self.counts = dict.fromkeys(self.BUCKETS, 0)
+        self.loaded = False
+        self._pending = None    # qayta yuklash paytidagi o'zgarishlar: user_id -> next_payment
+
+    @property
+    def total(self):
+        return len(self._buckets)
+
+    def _set_bucket(self, user_id, bucket):
+        old = self._buckets.get(user_id)
+        if old:
+            self.counts[old] -= 1
+        if bucket:
+            self.counts[bucket] += 1
+        self._buckets[user_id] = bucket
+
+    def track(self, user_id, next_payment, now=None):
+        """Bitta o'quvchi holatini yangilash"""
+        now = now or datetime.now(timezone.utc)
+        self._next_payments[user_id] = next_payment
+        self._set_bucket(user_id, payment_bucket(next_payment, now))
+        if self._pending is not None:
+            self._pending[user_id] = next_payment
+
+    def begin_rebuild(self):
+        """Bazadan o'qish boshlandi - shu paytdagi track() chaqiruvlari eslab qolinadi"""
+        self._pending = {}
+
+    def cancel_rebuild(self):
+        self._pending = None
+
+    def rebuild(self, students):
+        """Butun ro'yxatdan qaytadan hisoblash (o'qish paytidagi o'zgarishlar ustiga qo'llanadi)"""
+        pending, self._pending = self._pending or {}, None
+        self._next_payments.clear()
+        self._buckets.clear()
+        self.counts = dict.fromkeys(self.BUCKETS, 0)
+        now = datetime.now(timezone.utc)
+        for student in students:
+            self.track(student.user_id, student.next_payment, now)
+        for user_id, next_payment in pending.items():
+            self.track(user_id, next_payment, now)
+        self.loaded = True
+
+    def rollover(self):
+        """Vaqt o'tishi bilan kategoriyalarni siljitish (bazaga murojaatsiz)"""
+        now = datetime.now(timezone.utc)
+        for user_id, next_payment in self._next_payments.items():
+            self._set_bucket(user_id, payment_bucket(next_payment, now))
+
+
+STUDENT_FIELDS = (
+    "user_id", "name", "phone", "username", "group_id", "status",
+    "last_payment", "next_payment", "payment_days", "added_date"
+)
+
+# So'rovlarda faqat kerakli maydonlarni olish (proyeksiya)
+STATS_FIELDS = ["user_id", "next_payment"]
+RESTORE_FIELDS = ["user_id", "next_payment", "status"]
+REMINDER_FIELDS = ["user_id", "name", "username", "group_id", "next_payment"]
+UPCOMING_FIELDS = ["user_id", "name", "phone", "group_id", "next_payment"]
+PAYMENT_FIELDS = ["user_id", "name", "group_id"]
+
+
+class Student:
+    """O'quvchi yozuvi (__slots__ bilan, Firestore hujjatidan yagona dekodlash yo'li)"""
+
+    __slots__ = STUDENT_FIELDS + ("next_date",)
+
+    def __init__(self, **fields):
+        for field in STUDENT_FIELDS:
+            setattr(self, field, fields.get(field))
+        # Ro'yxatlarda ko'p ishlatiladigan sana oldindan formatlanadi
+        self.next_date = self.next_payment.strftime('%d.%m.%Y') if self.next_payment else None
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        data = snapshot.to_dict()
+        if data.get("user_id") is None:
+            data["user_id"] = int(snapshot.id)
+        return cls(**data)
+
+    @property
+    def mention(self):
+        return f"@{self.username}" if self.username else self.name
+
+    def days_left(self, now):
+        """To'lovgacha qolgan kunlar (belgilanmagan bo'lsa None)"""
+        return (self.next_payment - now).days if self.next_payment else None
+
+    def bucket(self, now):
+        return payment_bucket(self.next_payment, now)
+
+
+class Group:
+    """Guruh yozuvi"""
+
+    __slots__ = ("group_id", "title", "added_date")
+
+    def __init__(self, group_id, title, added_date=None, **_):
+        self.group_id = group_id
+        self.title = title
+        self.added_date = added_date
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(**snapshot.to_dict())
+
+
+class RosterCache:
+    """Firestore on_snapshot tinglovchilari bilan yangilanadigan xotiradagi ro'yxat"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._students_ready = False
+        self._groups_ready = False
+        self._failed = False
+        self._watches = []
+        self.students = {}
+        self.groups = {}
+        self._ids = []          # saralangan user_id lar
+        self._by_group = {}     # group_id -> {user_id}
+        self._by_due = []       # saralangan (next_payment, user_id)
+
+    @property
+    def ready(self):
+        return self._students_ready and self._groups_ready
+
+    @property
+    def alive(self):
+        """Tinglovchilar ishlayaptimi (xato bilan to'xtagan watch _closed bo'ladi)"""
+        if self._failed or not self._watches:
+            return False
+        return not any(getattr(watch, "_closed", False) for watch in self._watches)
+
+    def start(self, client):
+        # Yangi tinglovchi to'liq snapshot yuboradi - eski holat tozalanadi
+        with self._lock:
+            self._students_ready = False
+            self._groups_ready = False
+            self._failed = False
+            self.students = {}
+            self._ids = []
+            self._by_group = {}
+            self._by_due = []
+        # Ikkinchisi ochilmasa ham birinchisi stop() da yopilishi uchun ketma-ket qo'shiladi
+        self._watches = []
+        self._watches.append(client.collection("students").on_snapshot(self._on_students))
+        self._watches.append(client.collection("groups").on_snapshot(self._on_groups))
+
+    def stop(self):
+        for watch in self._watches:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                # Xato bilan yopilgan watch close() da sababni qayta ko'taradi
+                logger.debug(f"Tinglovchini yopishda xato: {e}")
+        self._watches = []
+
+    def restart(self, client):
+        """To'xtagan tinglovchilarni qayta ishga tushirish"""
+        self.invalidate("tinglovchi to'xtagan")
+        self.stop()
+        self.start(client)
+
+    def invalidate(self, reason):
+        """Kesh eskirgan - repozitoriylar Firestore so'rovlariga qaytadi"""
+        if self._students_ready or self._groups_ready:
+            logger.warning(f"⚠️ Ro'yxat keshi o'chirildi: {reason}")
+        self._students_ready = False
+        self._groups_ready = False
+
+    def _remove(self, user_id):
+        record = self.students.pop(user_id, None)
+        if record is None:
+            return
+        del self._ids[bisect_left(self._ids, user_id)]
+        self._by_group.get(record.group_id, set()).discard(user_id)
+        if record.next_payment:
+            key = (record.next_payment, user_id)
+            index = bisect_left(self._by_due, key)
+            if index < len(self._by_due) and self._by_due[index] == key:
+                del self._by_due[index]
+
+    def _add(self, record):
+        self._remove(record.user_id)
+        self.students[record.user_id] = record
+        insort(self._ids, record.user_id)
+        self._by_group.setdefault(record.group_id, set()).add(record.user_id)
+        if record.next_payment:
+            insort(self._by_due, (record.next_payment, record.user_id))
+
+    def _on_students(self, snapshot, changes, read_time):
+        # Firestore fon oqimida chaqiriladi
+        metrics.inc("firestore_reads_total", max(1, len(changes)), handler="roster")
+        try:
+            with self._lock:
+                for change in changes:
+                    if change.type.name == "REMOVED":
+                        self._remove(int(change.document.id))
+                    else:
+                        self._add(Student.from_snapshot(change.document))
+                self._students_ready = True
+        except Exception as e:
+            logger.error(f"O'quvchilar tinglovchisida xato: {e}")
+            self._failed = True
+            self.invalidate(e)
+
+    def _on_groups(self, snapshot, changes, read_time):
+        metrics.inc("firestore_reads_total", max(1, len(changes)), handler="roster")
+        try:
+            groups = {}
+            for doc in snapshot:
+                group = Group.from_snapshot(doc)
+                groups[group.group_id] = group
+            self.groups = groups
+            self._groups_ready = True
+        except Exception as e:
+            logger.error(f"Guruhlar tinglovchisida xato: {e}")
+            self._failed = True
+            self.invalidate(e)
+
+    def get(self, user_id):
+        with self._lock:
+            return self.students.get(user_id)
+
+    def get_many(self, user_ids):
+        with self._lock:
+            return {user_id: self.students[user_id] for user_id in user_ids if user_id in self.students}
+
+    def all(self):
+        with self._lock:
+            return [self.students[user_id] for user_id in self._ids]
+
+    def by_group(self, group_id):
+        with self._lock:
+            return [self.students[user_id] for user_id in sorted(self._by_group.get(group_id, ()))]
+
+    def count(self, group_id=None):
+        with self._lock:
+            if group_id is None:
+                return len(self.students)
+            return len(self._by_group.get(group_id, ()))
+
+    def page(self, after, before, limit):
+        with self._lock:
+            if before is not None:
+                end = bisect_left(self._ids, before)
+                start = max(0, end - limit)
+                ids = self._ids[start:end]
+                has_prev, has_next = start > 0, True
+            else:
+                start = bisect_right(self._ids, after) if after is not None else 0
+                ids = self._ids[start:start + limit]
+                has_prev, has_next = after is not None, start + limit < len(self._ids)
+            return [self.students[user_id] for user_id in ids], has_prev, has_next
+
+    def due_before(self, until, inclusive=False, group_id=None):
+        """To'lov muddati `until` gacha bo'lganlar (next_payment bo'yicha saralangan)"""
+        with self._lock:
+            if inclusive:
+                end = bisect_right(self._by_due, (until, float("inf")))
+            else:
+                end = bisect_left(self._by_due, (until, float("-inf")))
+            students = (self.students[user_id] for _, user_id in self._by_due[:end])
+            return [student for student in students if group_id is None or student.group_id == group_id]
+
+    def upcoming(self, limit):
+        with self._lock:
+            return [self.students[user_id] for _, user_id in self._by_due[:limit]]
+
+    def count_with_next_payment(self):
+        with self._lock:
+            return len(self._by_due)
+
+    def count_due_after(self, group_id, since):
+        with self._lock:
+            return sum(
+                1 for user_id in self._by_group.get(group_id, ())
+                if self.students[user_id].next_payment and self.students[user_id].next_payment >= since
+            )
+
+
+class StudentRepository:
+    """O'quvchilar kolleksiyasi bilan ishlash (roster keshi yoqilgan bo'lsa undan o'qiydi)"""
+
+    def __init__(self, client, roster=None):
+        self.client = client
+        self.collection = client.collection("students")
+        self.roster = roster
+
+    @property
+    def cache(self):
+        """Tayyor roster keshi (o'chirilgan yoki hali yuklanmagan bo'lsa None)"""
+        if self.roster is not None and self.roster.ready:
+            return self.roster
+        return None
+
+    async def get(self, user_id):
+        """Bitta o'quvchi (topilmasa None)"""
+        if self.cache:
+            return self.cache.get(user_id)
+        snapshot = await run_db(self.collection.document(str(user_id)).get)
+        count_reads(1)
+        return Student.from_snapshot(snapshot) if snapshot.exists else None
+
+    async def all(self, fields=None):
+        """Barcha o'quvchilar (fields - faqat shu maydonlarni o'qish)"""
+        if self.cache:
+            return self.cache.all()
+        return await run_db(_to_students, self.collection, fields)
+
+    async def by_group(self, group_id):
+        """Guruhga biriktirilgan o'quvchilar"""
+        if self.cache:
+            return self.cache.by_group(group_id)
+        return await run_db(_to_students, self.collection.where("group_id", "==", group_id))
+
+    def _page(self, after, before, limit):
+        query = self.collection.order_by("user_id")
+        if before is not None:
+            docs = query.end_before({"user_id": before}).limit_to_last(limit + 1).get()
+            count_reads(max(1, len(docs)))
+            return [Student.from_snapshot(doc) for doc in docs[-limit:]], len(docs) > limit, True
+        if after is not None:
+            query = query.start_after({"user_id": after})
+        docs = [Student.from_snapshot(doc) for doc in query.limit(limit + 1).stream()]
+        count_reads(max(1, len(docs)))
+        return docs[:limit], after is not None, len(docs) > limit
+
+    async def page(self, after=None, before=None, limit=PAGE_SIZE):
+        """user_id bo'yicha bitta sahifa: (o'quvchilar, oldingi bormi, keyingi bormi)"""
+        if self.cache:
+            return self.cache.page(after, before, limit)
+        return await run_db(self._page, after, before, limit)
+
+    async def iter_all(self, batch_size=STREAM_BATCH):
+        """Barcha o'quvchilarni sahifalab oqim sifatida o'qish"""
+        after = None
+        while True:
+            students, _, has_next = await self.page(after=after, limit=batch_size)
+            for student in students:
+                yield student
+            if not has_next:
+                return
+            after = students[-1].user_id
+
+    async def count(self):
+        """Jami o'quvchilar soni (aggregation so'rovi)"""
+        if self.cache:
+            return self.cache.count()
+        return await run_db(_count, self.collection)
+
+    async def with_next_payment(self):
+        """To'lov sanasi belgilangan o'quvchilar"""
+        if self.cache:
+            return self.cache.due_before(datetime.max.replace(tzinfo=timezone.utc), inclusive=True)
+        return await run_db(_to_students, self.collection.where("next_payment", ">", EPOCH), RESTORE_FIELDS)
+
+    async def upcoming(self, limit):
+        """To'lov sanasi eng yaqin o'quvchilar (server tomonida saralangan)"""
+        if self.cache:
+            return self.cache.upcoming(limit)
+        query = (
+            self.collection
+            .where("next_payment", ">", EPOCH)
+            .order_by("next_payment")
+            .limit(limit)
+        )
+        return await run_db(_to_students, query, UPCOMING_FIELDS)
+
+    async def count_with_next_payment(self):
+        if self.cache:
+            return self.cache.count_with_next_payment()
+        return await run_db(_count, self.collection.where("next_payment", ">", EPOCH))
+
+    async def due(self, now):
+        """To'lov muddati kelgan, hali kechikkan deb belgilanmagan o'quvchilar"""
+        if self.cache:
+            return [
+                student for student in self.cache.due_before(now, inclusive=True)
+                if student.status in ("active", "paid")
+            ]
+        query = (
+            self.collection
+            .where("status", "in", ["active", "paid"])
+            .where("next_payment", "<=", now)
+        )
+        return await run_db(_to_students, query, REMINDER_FIELDS)
+
+    def _get_many(self, user_ids):
+        refs = [self.collection.document(str(user_id)) for user_id in user_ids]
+        snapshots = self.client.get_all(refs, field_paths=PAYMENT_FIELDS)
+        count_reads(len(refs))
+        return {int(snapshot.id): Student.from_snapshot(snapshot) for snapshot in snapshots if snapshot.exists}
+
+    async def get_many(self, user_ids):
+        """Bir nechta o'quvchini bitta get_all bilan olish: {user_id: Student}"""
+        if self.cache:
+            return self.cache.get_many(user_ids)
+        if not user_ids:
+            return {}
+        return await run_db(self._get_many, list(user_ids))
+
+    def _set_each(self, items):
+        for start in range(0, len(items), BATCH_LIMIT):
+            batch = self.client.batch()
+            chunk = items[start:start + BATCH_LIMIT]
+            for user_id, data in chunk:
+                batch.set(self.collection.document(str(user_id)), data)
+            batch.commit()
+            count_writes(len(chunk))
+
+    async def add_many(self, items):
+        """(user_id, ma'lumot) juftliklarini batch yozuvlar bilan qo'shish"""
+        await run_db(self._set_each, list(items))
+
+    def _update_each(self, updates):
+        for start in range(0, len(updates), BATCH_LIMIT):
+            batch = self.client.batch()
+            chunk = updates[start:start + BATCH_LIMIT]
+            for user_id, fields in chunk:
+                batch.update(self.collection.document(str(user_id)), fields)
+            batch.commit()
+            count_writes(len(chunk))
+
+    async def update_each(self, updates):
+        """(user_id, maydonlar) juftliklarini batch yozuvlar bilan saqlash"""
+        await run_db(self._update_each, list(updates))
+
+    async def update_many(self, user_ids, fields):
+        """Bir nechta o'quvchiga bir xil maydonlarni yozish"""
+        await self.update_each([(user_id, fields) for user_id in user_ids])
+
+    async def due_in_group(self, group_id, until):
+        """Guruhda to'lov muddati `until` dan oldin bo'lganlar (saralangan)"""
+        if self.cache:
+            return self.cache.due_before(until, group_id=group_id)
+        query = (
+            self.collection
+            .where("group_id", "==", group_id)
+            .where("next_payment", "<", until)
+            .order_by("next_payment")
+        )
+        return await run_db(_to_students, query, REMINDER_FIELDS)
+
+    async def due_all(self, until):
+        """Barcha guruhlarda to'lov muddati `until` dan oldin bo'lganlar (saralangan)"""
+        if self.cache:
+            return self.cache.due_before(until)
+        query = self.collection.where("next_payment", "<", until).order_by("next_payment")
+        return await run_db(_to_students, query, REMINDER_FIELDS)
+
+    async def count_paid_in_group(self, group_id, since):
+        """Guruhda to'lov muddati `since` dan keyin bo'lganlar soni"""
+        if self.cache:
+            return self.cache.count_due_after(group_id, since)
+        query = (
+            self.collection
+            .where("group_id", "==", group_id)
+            .where("next_payment", ">=", since)
+        )
+        return await run_db(_count, query)
+
+    async def count_by_group(self, group_id):
+        """Guruhdagi o'quvchilar soni (aggregation so'rovi)"""
+        if self.cache:
+            return self.cache.count(group_id)
+        return await run_db(_count, self.collection.where("group_id", "==", group_id))
+
+    async def add(self, user_id, data):
+        await run_db(self.collection.document(str(user_id)).set, data)
+        count_writes(1)
+
+    async def update(self, user_id, fields):
+        await run_db(self.collection.document(str(user_id)).update, fields)
+        count_writes(1)
+
+
+class PaymentRepository:
+    """To'lovlar tarixi (o'zgarmaydigan yozuvlar) va oylik yig'ma hujjatlar"""
+
+    # Har bir to'lov: o'quvchi + tarix yozuvi + oylik yig'ma (<= 500 yozuv)
+    CHUNK = BATCH_LIMIT // 3
+
+    def __init__(self, client):
+        from firebase_admin import firestore
+        
+        self.client = client
+        self.increment = firestore.Increment
+        self.students = client.collection("students")
+        self.collection = client.collection("payments")
+        self.monthly_collection = client.collection("payment_stats")
+
+    def _record(self, entries):
+        for start in range(0, len(entries), self.CHUNK):
+            batch = self.client.batch()
+            monthly = {}
+            chunk = entries[start:start + self.CHUNK]
+            for student, fields in chunk:
+                paid_at = fields["last_payment"]
+                month = payment_month(paid_at)
+                group_id = student.group_id
+                
+                batch.update(self.students.document(str(student.user_id)), fields)
+                batch.set(self.collection.document(), {
+                    "user_id": student.user_id,
+                    "group_id": group_id,
+                    "paid_at": paid_at,
+                    "days": fields["payment_days"],
+                    "next_payment": fields["next_payment"],
+                    "month": month
+                })
+                
+                count, days = monthly.get((month, group_id), (0, 0))
+                monthly[(month, group_id)] = (count + 1, days + fields["payment_days"])
+            
+            # Bitta batchda har bir oylik hujjatga bitta yozuv
+            for (month, group_id), (count, days) in monthly.items():
+                batch.set(self.monthly_collection.document(f"{month}_{group_id}"), {
+                    "month": month,
+                    "group_id": group_id,
+                    "count": self.increment(count),
+                    "days": self.increment(days)
+                }, merge=True)
+            batch.commit()
+            count_writes(2 * len(chunk) + len(monthly))
+
+    async def record(self, entries):
+        """(Student, to'lov maydonlari) juftliklarini bitta batchda yozish"""
+        await run_db(self._record, list(entries))
+
+    async def monthly(self, month):
+        """Berilgan oy ("YYYY-MM") uchun guruhlar bo'yicha yig'ma hujjatlar"""
+        return await run_db(_to_dicts, self.monthly_collection.where("month", "==", month))
+
+
+class GroupRepository:
+    """Guruhlar kolleksiyasi bilan ishlash (TTL keshi bilan)"""
+
+    def __init__(self, client, ttl=GROUP_CACHE_TTL, roster=None):
+        self.client = client
+        self.collection = client.collection("groups")
+        self.roster = roster
+        self.ttl = ttl
+        self._cache = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _load(self):
+        """Guruhlarni bitta so'rov bilan keshga yuklash"""
+        if self.roster is not None and self.roster.ready:
+            return self.roster.groups
+        async with self._lock:
+            if self._cache is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._cache
+            groups = await run_db(_to_groups, self.collection)
+            self._cache = {group.group_id: group for group in groups}
+            self._loaded_at = time.monotonic()
+            return self._cache
+
+    def invalidate(self):
+        self._cache = None
+
+    async def get(self, group_id):
+        """Bitta guruh (topilmasa None)"""
+        cache = await self._load()
+        if group_id in cache:
+            return cache[group_id]
+        # Boshqa nusxa qo'shgan bo'lishi mumkin - bazadan tekshiramiz
+        snapshot = await run_db(self.collection.document(str(group_id)).get)
+        count_reads(1)
+        if not snapshot.exists:
+            return None
+        group = Group.from_snapshot(snapshot)
+        cache[group_id] = group
+        return group
+
+    async def all(self):
+        """Barcha guruhlar"""
+        cache = await self._load()
+        return list(cache.values())
+
+    async def titles(self):
+        """group_id -> nomi lug'ati"""
+        cache = await self._load()
+        return {group_id: group.title for group_id, group in cache.items()}
+
+    async def save(self, group_id, data):
+        await run_db(self.collection.document(str(group_id)).set, data)
+        count_writes(1)
+        self.invalidate()
+
+
+class TokenBucket:
+    """Token bucket tezlik cheklovchisi"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class DeliveryReport:
+    """Ommaviy yuborish natijasi"""
+
+    def __init__(self):
+        self.sent = 0
+        self.retried = 0
+        self.failed = []
+        self.transient = set()  # vaqtinchalik xato (tarmoq, RetryAfter) - keyinroq qayta urinish mumkin
+
+    def summary(self, title="📨 Eslatmalar"):
+        text = f"{title}\n\n✅ Yuborildi: {self.sent} ta\n"
+        if self.retried:
+            text += f"🔁 Qayta urinishlar: {self.retried} ta\n"
+        if self.failed:
+            text += f"❌ Xato: {len(self.failed)} ta\n\n"
+            for chat_id, error in self.failed[:10]:
+                text += f"🆔 {chat_id}: {error}\n"
+            if len(self.failed) > 10:
+                text += f"... va yana {len(self.failed) - 10} ta\n"
+        return text
+
+
+def _retry_seconds(error):
+    delay = error.retry_after
+    return delay.total_seconds() if isinstance(delay, timedelta) else float(delay)
+
+
+class Broadcaster:
+    """Telegram cheklovlariga rioya qilgan holda xabar yuborish"""
+
+    def __init__(self, bot, rate=BROADCAST_RATE, concurrency=BROADCAST_CONCURRENCY):
+        self.bot = bot
+        self.bucket = TokenBucket(rate)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self._chat_ready = {}
+
+    async def _wait_chat(self, chat_id):
+        """Bitta chatga yuborish oralig'ini saqlash"""
+        interval = GROUP_CHAT_INTERVAL if chat_id < 0 else PRIVATE_CHAT_INTERVAL
+        now = time.monotonic()
+        if len(self._chat_ready) > 10000:
+            self._chat_ready = {k: v for k, v in self._chat_ready.items() if v > now}
+        ready = max(now, self._chat_ready.get(chat_id, 0.0))
+        self._chat_ready[chat_id] = ready + interval
+        if ready > now:
+            await asyncio.sleep(ready - now)
+
+    async def send(self, chat_id, text, report=None, **kwargs):
+        """Bitta xabar yuborish (RetryAfter va tarmoq xatolarida qayta urinadi)"""
+        await self._wait_chat(chat_id)
+        async with self.semaphore:
+            for attempt in range(BROADCAST_RETRIES + 1):
+                await self.bucket.acquire()
+                try:
+                    message = await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                    metrics.inc("telegram_sent_total", method="send_message")
+                    if report is not None:
+                        report.sent += 1
+                    return message
+                except RetryAfter as e:
+                    metrics.inc("telegram_retry_after_total", method="send_message")
+                    if attempt == BROADCAST_RETRIES:
+                        metrics.inc("telegram_failed_total", method="send_message", reason=type(e).__name__)
+                        raise
+                    delay = _retry_seconds(e)
+                except (BadRequest, Forbidden) as e:
+                    metrics.inc("telegram_failed_total", method="send_message", reason=type(e).__name__)
+                    raise
+                except NetworkError as e:
+                    if attempt == BROADCAST_RETRIES:
+                        metrics.inc("telegram_failed_total", method="send_message", reason=type(e).__name__)
+                        raise
+                    delay = 2 ** attempt
+                if report is not None:
+                    report.retried += 1
+                logger.warning(f"Xabar qayta yuboriladi ({chat_id}), {delay:.0f} s kutish")
+                await asyncio.sleep(delay)
+
+    async def _send_reported(self, chat_id, text, report):
+        try:
+            await self.send(chat_id, text, report)
+        except Exception as e:
+            logger.error(f"Xabar yuborishda xato ({chat_id}): {e}")
+            report.failed.append((chat_id, str(e)))
+            if isinstance(e, (RetryAfter, NetworkError)) and not isinstance(e, BadRequest):
+                report.transient.add(chat_id)
+
+    async def broadcast(self, messages):
+        """(chat_id, matn) juftliklarini parallel yuborish"""
+        report = DeliveryReport()
+        await asyncio.gather(*(self._send_reported(chat_id, text, report) for chat_id, text in messages))
+        return report
+
+
+class UsernameResolver:
+    """Telegram usernamelarini tezlik cheklovi va TTL kesh bilan aniqlash"""
+
+    def __init__(self, bot, rate=USERNAME_RATE, concurrency=USERNAME_CONCURRENCY, ttl=USERNAME_CACHE_TTL):
+        self.bot = bot
+        self.ttl = ttl
+        self.bucket = TokenBucket(rate)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self._cache = {}
+
+    def cached(self, user_id):
+        """Keshdagi username (yo'q yoki eskirgan bo'lsa None)"""
+        entry = self._cache.get(user_id)
+        if entry and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    async def resolve(self, user_id):
+        """(aniqlandimi, username) - chat topilmasa yoki xato bo'lsa (False, None)"""
+        entry = self._cache.get(user_id)
+        if entry and time.monotonic() - entry[1] < self.ttl:
+            return True, entry[0]
+        
+        async with self.semaphore:
+            await self.bucket.acquire()
+            try:
+                chat = await self.bot.get_chat(user_id)
+            except RetryAfter as e:
+                metrics.inc("telegram_retry_after_total", method="get_chat")
+                await asyncio.sleep(_retry_seconds(e))
+                return False, None
+            except Exception as e:
+                metrics.inc("telegram_failed_total", method="get_chat", reason=type(e).__name__)
+                return False, None
+        
+        metrics.inc("telegram_sent_total", method="get_chat")
+        self._cache[user_id] = (chat.username, time.monotonic())
+        return True, chat.username
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Turli chatlar parallel, bitta chat updatelari esa kelish tartibida qayta ishlanadi"""
+
+    def __init__(self, max_concurrent_updates=UPDATE_CONCURRENCY):
+        # PTB semafori chat navbatida kutayotgan updatelarni ham hisoblaydi - shuning uchun
+        # unga katta chegara beriladi, haqiqiy cheklov chat qulfidan keyin olinadi
+        super().__init__(2 ** 30)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._locks = {}    # chat_id -> [lock, kutayotganlar soni]
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._slots:
+                await coroutine
+            return
+        
+        entry = self._locks.setdefault(chat.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+def build_scheduler():
+    """Doimiy (SQLite) job store bilan scheduler yaratish"""
+    jobstores = {"memory": MemoryJobStore()}
+    try:
+        from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+        jobstores["default"] = SQLAlchemyJobStore(url=SCHEDULER_DB_URL)
+    except ImportError:
+        logger.warning("⚠️ SQLAlchemy o'rnatilmagan, eslatmalar faqat xotirada saqlanadi.")
+        jobstores["default"] = MemoryJobStore()
+    
+    # Bot o'chiq paytda o'tib ketgan eslatmalar bir marta yuboriladi
+    return AsyncIOScheduler(
+        jobstores=jobstores,
+        job_defaults={"coalesce": True, "misfire_grace_time": None}
+    )
+
+
+# main() ichida o'rnatiladi (saqlangan vazifalar shu orqali botga murojaat qiladi)
+payment_bot = None
+
+
+async def reminder_job(user_id: int):
+    """Saqlangan scheduler vazifasi: o'quvchiga to'lov eslatmasi"""
+    await payment_bot.send_reminder(payment_bot.application, user_id)
+
+
+def reminder_text(name):
+    """O'quvchiga yuboriladigan eslatma matni"""
+    return (
+        f"⏰ TO'LOV ESLATMASI\n\n"
+        f"Hurmatli {name},\n"
+        f"Sizning to'lov muddatingiz tugadi!\n\n"
+        f"📅 To'lov sanasi: Bugun\n"
+        f"📱 Admin bilan bog'laning."
+    )
+
+
+class PaymentBot:
+    def __init__(self, client, scheduler=None):
+        self.client = client
+        self.scheduler = scheduler
+        self.application = None
+        self.broadcaster = None
+        self.usernames = None
         self.temp_data = {}
+        self._background_tasks = set()
+        self._reminder_report = None
+        self.metrics_server = None
+        self.roster = RosterCache() if ROSTER_CACHE else None
+        self.students = StudentRepository(client, roster=self.roster)
+        self.groups = GroupRepository(client, roster=self.roster)
+        self.payments = PaymentRepository(client)
+        self.stats = PaymentStats()
+        self._stats_lock = asyncio.Lock()
+
+    async def post_init(self, application: Application):
+        """Application ishga tushgach scheduler va eslatmalarni tiklash"""
+        started = time.perf_counter()
+        self.application = application
+        self.broadcaster = Broadcaster(application.bot)
+        self.usernames = UsernameResolver(application.bot)
+        if self.roster is not None:
+            self.roster.start(self.client)
+        if METRICS_PORT:
+            metrics.collectors.append(self.collect_metrics)
+            self.metrics_server = await metrics.serve(METRICS_HOST, METRICS_PORT)
+            logger.info(f"📈 Metrikalar: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        
+        # Scheduler (SQLAlchemy importi) va guruhlar keshi parallel tayyorlanadi
+        if self.scheduler is None:
+            self.scheduler, groups = await asyncio.gather(
+                asyncio.to_thread(build_scheduler),
+                self.groups.all()
+            )
+        else:
+            groups = await self.groups.all()
+        warmed = time.perf_counter()
+        
+        # Statistika vazifalari bound metod - faqat xotirada saqlanadi
+        self.scheduler.add_job(
+            self.rollover_stats,
+            'interval',
+            minutes=STATS_ROLLOVER_MINUTES,
+            id="stats_rollover",
+            jobstore="memory"
+        )
+        # Har kuni yarim tunda bazadan to'liq qayta hisoblash
+        self.scheduler.add_job(
+            self.refresh_stats, 'cron', hour=0, minute=0, id="stats_rebuild", jobstore="memory"
+        )
+        self.scheduler.add_job(
+            self.refresh_usernames,
+            'interval',
+            hours=USERNAME_REFRESH_HOURS,
+            id="username_refresh",
+            jobstore="memory"
+        )
+        if self.roster is not None:
+            self.scheduler.add_job(
+                self.check_roster,
+                'interval',
+                seconds=ROSTER_CHECK_SECONDS,
+                id="roster_check",
+                jobstore="memory"
+            )
+        self.schedule_group_reminders()
+        self.scheduler.start()
+        
+        if REMINDER_MODE == "sweep":
+            self.start_sweep()
+        else:
+            await self.restore_reminders()
+        
+        logger.info(
+            f"🚀 post_init: scheduler va {len(groups)} ta guruh {warmed - started:.2f} s, "
+            f"eslatmalar {time.perf_counter() - warmed:.2f} s"
+        )
+
+    async def rollover_stats(self):
+        """Statistika kategoriyalarini siljitish - event loopda (track() bilan bir oqimda) bajariladi"""
+        self.stats.rollover()
+
+    async def check_roster(self):
+        """To'xtagan on_snapshot tinglovchilarini aniqlash va qayta ulash"""
+        if self.roster.alive:
+            return
+        logger.warning("🔄 Ro'yxat tinglovchilari to'xtagan - qayta ulanmoqda")
+        try:
+            await run_db(self.roster.restart, self.client)
+        except Exception as e:
+            logger.error(f"Tinglovchilarni qayta ulashda xato: {e}")
+
+    async def collect_metrics(self):
+        """Scheduler navbati va fon vazifalari (metrikalar so'ralganda)"""
+        if self.scheduler is None:
+            return
+        jobs = await asyncio.to_thread(self.scheduler.get_jobs)
+        now = datetime.now(timezone.utc)
+        metrics.set("scheduler_jobs", len(jobs))
+        metrics.set("scheduler_jobs_due", sum(1 for job in jobs if job.next_run_time and job.next_run_time <= now))
+        metrics.set("background_tasks", len(self._background_tasks))
+
+    async def post_shutdown(self, application: Application):
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        if self.scheduler is not None and self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        if self.roster is not None:
+            self.roster.stop()
+
+    def spawn(self, coro):
+        """Fon vazifasini ishga tushirish (tugaguncha havola saqlanadi)"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    @tracked("refresh_usernames")
+    async def refresh_usernames(self):
+        """Barcha o'quvchilar usernamelarini fonda yangilash"""
+        changed = 0
+        chunk = []
+        async for data in self.students.iter_all():
+            chunk.append(data)
+            if len(chunk) >= BATCH_LIMIT:
+                changed += await self.update_usernames(chunk)
+                chunk = []
+        if chunk:
+            changed += await self.update_usernames(chunk)
+        logger.info(f"🔗 Usernamelar yangilandi: {changed} ta o'zgardi")
+
+    async def update_usernames(self, students):
+        """Usernamelarni aniqlab, faqat o'zgarganlarini batch bilan yozish"""
+        try:
+            results = await asyncio.gather(*(self.usernames.resolve(student.user_id) for student in students))
+            updates = [
+                (student.user_id, {"username": username})
+                for student, (resolved, username) in zip(students, results)
+                if resolved and username != student.username
+            ]
+            if updates:
+                await self.students.update_each(updates)
+            return len(updates)
+        except Exception as e:
+            logger.error(f"Usernamelarni yangilashda xato: {e}")
+            return 0
+
+    def schedule_group_reminders(self):
+        """Guruhlarga kunlik avtomatik eslatma vazifasi"""
+        if not GROUP_REMINDER_TIME:
+            return
+        try:
+            hour, minute = (int(part) for part in GROUP_REMINDER_TIME.split(":"))
+        except ValueError:
+            logger.error(f"❌ GROUP_REMINDER_TIME noto'g'ri: {GROUP_REMINDER_TIME} (format: HH:MM)")
+            return
+        
+        self.scheduler.add_job(
+            self.scheduled_group_reminders,
+            'cron',
+            hour=hour,
+            minute=minute,
+            timezone=REMINDER_TIMEZONE,
+            id="daily_group_reminders",
+            jobstore="memory"
+        )
+        logger.info(f"📨 Guruhlarga kunlik eslatma: har kuni {hour:02d}:{minute:02d} ({REMINDER_TIMEZONE})")
+
+    @tracked("scheduled_group_reminders")
+    async def scheduled_group_reminders(self):
+        """Barcha guruhlarga avtomatik eslatma va adminga hisobot"""
+        try:
+            lines = await self.remind_all_groups()
+        except Exception as e:
+            logger.error(f"Avtomatik eslatmada xato: {e}")
+            await self.notify_admin(f"❌ Avtomatik guruh eslatmasida xato: {e}")
+            return
+        
+        report = MessageStream(self.notify_admin)
+        await report.write("🕘 Avtomatik eslatma\n\n")
+        for line in lines:
+            await report.write(line)
+        await report.flush()
+
+    def start_sweep(self):
+        """Har bir o'quvchi vazifasi o'rniga bitta davriy tekshiruv"""
+        # Oldingi "jobs" rejimidan qolgan vazifalar ikki marta yubormasligi uchun
+        for job in self.scheduler.get_jobs():
+            if job.id.startswith("reminder_"):
+                job.remove()
+        
+        self.scheduler.add_job(
+            self.sweep_due_payments,
+            'interval',
+            minutes=SWEEP_INTERVAL_MINUTES,
+            next_run_time=datetime.now(timezone.utc),
+            id="due_sweep",
+            jobstore="memory"
+        )
+
+    @tracked("sweep")
+    async def sweep_due_payments(self):
+        """Muddati kelgan o'quvchilarga eslatma yuborish va statusni yangilash"""
+        now = datetime.now(timezone.utc)
+        try:
+            students = await self.students.due(now)
+        except Exception as e:
+            logger.error(f"Muddatlarni tekshirishda xato: {e}")
+            return
+        
+        if not students:
+            return
+        
+        report = await self.broadcaster.broadcast(
+            (student.user_id, reminder_text(student.name)) for student in students
+        )
+        
+        # Statuslarni bitta batch bilan yangilash (vaqtinchalik xato bo'lganlar keyingi tekshiruvda
+        # qayta yuboriladi; Forbidden/BadRequest esa har safar qayta xabar bermasligi uchun belgilanadi)
+        students = [student for student in students if student.user_id not in report.transient]
+        await self.students.update_many([student.user_id for student in students], {"status": "overdue"})
+        for student in students:
+            self.stats.track(student.user_id, student.next_payment, now)
+        
+        logger.info(f"⏰ Eslatmalar yuborildi: {report.sent} ta, xato: {len(report.failed)} ta")
+        await self.notify_admin(report.summary("⏰ TO'LOV ESLATMALARI"))
+
+    async def notify_admin(self, text):
+        """Adminga hisobot yuborish"""
+        try:
+            await self.broadcaster.send(ADMIN_ID, text)
+        except Exception as e:
+            logger.error(f"Adminga hisobot yuborishda xato: {e}")
+
+    def schedule_reminder(self, user_id, run_date):
+        """O'quvchi uchun eslatma vazifasini qo'shish (eskisini almashtiradi)"""
+        if REMINDER_MODE == "sweep":
+            return
+        self.scheduler.add_job(
+            reminder_job,
+            'date',
+            run_date=run_date,
+            args=[user_id],
+            id=f"reminder_{user_id}",
+            replace_existing=True
+        )
 
+    async def restore_reminders(self):
+        """Yo'qolgan eslatma vazifalarini bitta so'rov bilan tiklash"""
+        students = await self.students.with_next_payment()
+        existing = {job.id for job in self.scheduler.get_jobs()}
+        now = datetime.now(timezone.utc)
+        
+        restored = 0
+        for student in students:
+            if f"reminder_{student.user_id}" in existing or student.status == "overdue":
+                continue
+            self.schedule_reminder(student.user_id, max(student.next_payment, now))
+            restored += 1
+        
+        logger.info(f"⏰ Eslatmalar tiklandi: {restored} ta")
+
+    @tracked("refresh_stats")
+    async def refresh_stats(self, if_missing=False):
+        """Statistikani bazadan qayta yuklash (bir vaqtda faqat bitta o'qish)"""
+        async with self._stats_lock:
+            if if_missing and self.stats.loaded:
+                return
+            self.stats.begin_rebuild()
+            try:
+                students = await self.students.all(STATS_FIELDS)
+            except Exception:
+                self.stats.cancel_rebuild()
+                raise
+            self.stats.rebuild(students)
+
+    @tracked("start")
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Bot ishga tushganda admin uchun keyboard"""
-        if self.scheduler is None:
-            self.scheduler = AsyncIOScheduler()
-            self.scheduler.start()
         
         user = update.effective_user
         chat_type = update.effective_chat.type
@@ -78,7 +1592,8 @@ class PaymentBot:
                 [KeyboardButton("➕ O'quvchi qo'shish"), KeyboardButton("💰 To'lov belgilash")],
                 [KeyboardButton("📋 O'quvchilar ro'yxati"), KeyboardButton("⏰ Qolgan kunlar")],
                 [KeyboardButton("📨 Guruhga to'lovlarni eslatish"), KeyboardButton("📊 Statistika")],
-                [KeyboardButton("📱 Guruhlar ro'yxati"), KeyboardButton("⚙️ Joriy guruhni o'rnatish")]
+                [KeyboardButton("📱 Guruhlar ro'yxati"), KeyboardButton("⚙️ Joriy guruhni o'rnatish")],
+                [KeyboardButton("📤 Eksport")]
             ]
             reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
             
@@ -93,6 +1608,7 @@ class PaymentBot:
                 "Assalomu alaykum! Sizning to'lovlaringiz adminlar tomonidan nazorat qilinadi."
             )
 
+    @tracked("setgroup")
     async def set_group(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Joriy guruhni o'rnatish"""
         if update.effective_user.id != ADMIN_ID:
@@ -105,7 +1621,7 @@ class PaymentBot:
             group_title = update.effective_chat.title
             
             # Guruh ma'lumotlarini saqlash
-            db.collection("groups").document(str(group_id)).set({
+            await self.groups.save(group_id, {
                 "group_id": group_id,
                 "title": group_title,
                 "added_date": datetime.now(timezone.utc)
@@ -125,65 +1641,58 @@ class PaymentBot:
 
     async def show_groups(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Barcha guruhlar ro'yxati"""
-        groups = db.collection("groups").stream()
+        groups = await self.groups.all()
         
-        text = "📱 GURUHLAR RO'YXATI\n"
-        text += "━━━━━━━━━━━━━━━━━━━━\n\n"
+        # Guruhlarga biriktirilgan o'quvchilar sonini parallel hisoblash
+        student_counts = await asyncio.gather(
+            *(self.students.count_by_group(group.group_id) for group in groups)
+        )
+        
+        report = MessageStream(update.message.reply_text)
+        await report.write(
+            "📱 GURUHLAR RO'YXATI\n"
+            "━━━━━━━━━━━━━━━━━━━━\n\n"
+        )
         
         count = 0
-        for group in groups:
-            data = group.to_dict()
+        for group, student_count in zip(groups, student_counts):
             count += 1
             
-            # Guruhga biriktirilgan o'quvchilar sonini hisoblash
-            students = db.collection("students").where("group_id", "==", data['group_id']).stream()
-            student_count = sum(1 for _ in students)
-            
-            text += f"{count}. {data['title']}\n"
-            text += f"   🆔 ID: {data['group_id']}\n"
-            text += f"   👥 O'quvchilar: {student_count} ta\n\n"
+            await report.write(
+                f"{count}. {group.title}\n"
+                f"   🆔 ID: {group.group_id}\n"
+                f"   👥 O'quvchilar: {student_count} ta\n\n"
+            )
         
         if count == 0:
-            text += "Hech qanday guruh topilmadi.\n\n"
-            text += "Guruhga botni qo'shing va /setgroup komandasini yuboring."
+            await report.write(
+                "Hech qanday guruh topilmadi.\n\n"
+                "Guruhga botni qo'shing va /setgroup komandasini yuboring."
+            )
         else:
-            text += "━━━━━━━━━━━━━━━━━━━━\n"
-            text += f"📊 Jami: {count} ta guruh"
+            await report.write(
+                "━━━━━━━━━━━━━━━━━━━━\n"
+                f"📊 Jami: {count} ta guruh"
+            )
         
-        await update.message.reply_text(text)
+        await report.flush()
 
     async def show_stats_text(self, update: Update):
         """Statistika ko'rsatish"""
-        students = db.collection("students").stream()
+        if not self.stats.loaded:
+            await self.refresh_stats(if_missing=True)
         
-        total = 0
-        paid = 0
-        overdue = 0
-        today = 0
-        week = 0
+        total = self.stats.total
+        paid = self.stats.counts["paid"]
+        overdue = self.stats.counts["overdue"]
+        today = self.stats.counts["today"]
+        week = self.stats.counts["week"]
         
-        now = datetime.now(timezone.utc)
-        
-        for student in students:
-            data = student.to_dict()
-            total += 1
-            
-            next_payment = data.get("next_payment")
-            if next_payment:
-                days_left = (next_payment - now).days
-                
-                if days_left < 0:
-                    overdue += 1
-                elif days_left == 0:
-                    today += 1
-                elif days_left <= 7:
-                    week += 1
-                else:
-                    paid += 1
-        
-        # Guruhlar statistikasi
-        groups = db.collection("groups").stream()
-        total_groups = sum(1 for _ in groups)
+        # Guruhlar statistikasi (keshdan) va shu oy to'lovlari (yig'ma hujjatlardan)
+        month = payment_month(datetime.now(timezone.utc))
+        groups, monthly = await asyncio.gather(self.groups.all(), self.payments.monthly(month))
+        total_groups = len(groups)
+        group_titles = {group.group_id: group.title for group in groups}
         
         text = "📊 UMUMIY STATISTIKA\n"
         text += "━━━━━━━━━━━━━━━━━━━━\n\n"
@@ -200,6 +1709,11 @@ class PaymentBot:
             paid_percent = (paid / total) * 100
             text += f"📈 To'lagan foiz: {paid_percent:.1f}%\n"
         
+        if monthly:
+            text += f"\n📅 SHU OY TO'LOVLARI ({month}):\n"
+            for data in sorted(monthly, key=lambda x: -x['count']):
+                text += f"📱 {group_titles.get(data['group_id'], 'Guruhsiz')}: {data['count']} ta\n"
+        
         text += "━━━━━━━━━━━━━━━━━━━━"
         
         await update.message.reply_text(text)
@@ -215,54 +1729,60 @@ class PaymentBot:
             
         text = update.message.text
         
-        if text == "➕ O'quvchi qo'shish":
-            await update.message.reply_text(
-                "👤 O'quvchining to'liq ismini kiriting:\n\n"
-                "Misol: Abdullayev Ali"
-            )
-            context.user_data['action'] = 'add_student'
-            context.user_data['step'] = 'name'
+        # Har bir tugma alohida metrika nomi bilan
+        with track(f"button:{text}"):
+            if text == "➕ O'quvchi qo'shish":
+                await update.message.reply_text(
+                    "👤 O'quvchining to'liq ismini kiriting:\n\n"
+                    "Misol: Abdullayev Ali\n\n"
+                    "📎 Ko'p o'quvchini qo'shish uchun CSV yoki Excel fayl yuboring.\n"
+                    "Ustunlar: name, phone, user_id, group_id"
+                )
+                context.user_data['action'] = 'add_student'
+                context.user_data['step'] = 'name'
             
-        elif text == "💰 To'lov belgilash":
-            await self.show_students_for_payment_text(update, context)
+            elif text == "💰 To'lov belgilash":
+                await self.show_students_for_payment_text(update, context)
             
-        elif text == "📋 O'quvchilar ro'yxati":
-            await self.list_students_text(update)
+            elif text == "📋 O'quvchilar ro'yxati":
+                await self.list_students_text(update)
             
-        elif text == "⏰ Qolgan kunlar":
-            await self.show_days_remaining_text(update)
+            elif text == "⏰ Qolgan kunlar":
+                await self.show_days_remaining_text(update)
             
-        elif text == "📨 Guruhga to'lovlarni eslatish":
-            await self.select_group_for_reminder(update, context)
+            elif text == "📨 Guruhga to'lovlarni eslatish":
+                await self.select_group_for_reminder(update, context)
             
-        elif text == "📊 Statistika":
-            await self.show_stats_text(update)
+            elif text == "📊 Statistika":
+                await self.show_stats_text(update)
             
-        elif text == "📱 Guruhlar ro'yxati":
-            await self.show_groups(update, context)
+            elif text == "📱 Guruhlar ro'yxati":
+                await self.show_groups(update, context)
             
-        elif text == "⚙️ Joriy guruhni o'rnatish":
-            await update.message.reply_text(
-                "⚙️ Guruhni o'rnatish:\n\n"
-                "1. Botni guruhga qo'shing\n"
-                "2. Botni admin qiling\n"
-                "3. Guruhda /setgroup kommandasini yuboring\n\n"
-                "Shundan keyin o'quvchilarni shu guruhga biriktirishingiz mumkin."
-            )
+            elif text == "📤 Eksport":
+                await self.export_students(update, "csv")
+            
+            elif text == "⚙️ Joriy guruhni o'rnatish":
+                await update.message.reply_text(
+                    "⚙️ Guruhni o'rnatish:\n\n"
+                    "1. Botni guruhga qo'shing\n"
+                    "2. Botni admin qiling\n"
+                    "3. Guruhda /setgroup kommandasini yuboring\n\n"
+                    "Shundan keyin o'quvchilarni shu guruhga biriktirishingiz mumkin."
+                )
 
     async def select_group_for_reminder(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Eslatma yuborish uchun guruhni tanlash"""
-        groups = db.collection("groups").stream()
+        groups = await self.groups.all()
         
         text = "📨 GURUHGA TO'LOV ESLATMASI\n\n"
         text += "Qaysi guruhga eslatma yuborishni xohlaysiz?\n\n"
         
         group_list = []
         for group in groups:
-            data = group.to_dict()
-            group_list.append(data)
-            text += f"🆔 Guruh ID: {data['group_id']}\n"
-            text += f"📱 Nomi: {data['title']}\n\n"
+            group_list.append(group)
+            text += f"🆔 Guruh ID: {group.group_id}\n"
+            text += f"📱 Nomi: {group.title}\n\n"
         
         if not group_list:
             text = "❌ Guruhlar topilmadi!\n\n"
@@ -273,7 +1793,8 @@ class PaymentBot:
             return
         
         text += "━━━━━━━━━━━━━━━━━━━━\n"
-        text += "Guruh ID sini kiriting:"
+        text += "Guruh ID sini kiriting:\n"
+        text += "(Barcha guruhlarga yuborish uchun 0 kiriting)"
         
         await update.message.reply_text(text)
         context.user_data['action'] = 'send_reminder'
@@ -286,7 +1807,13 @@ class PaymentBot:
             
         if update.effective_user.id != ADMIN_ID:
             return
+        
+        # Metrika nomi - jarayon va qadam (masalan "message:mark_payment:payment_days")
+        with track(f"message:{context.user_data.get('action')}:{context.user_data.get('step')}"):
+            await self.process_message(update, context)
 
+    async def process_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Admin xabarini joriy jarayon qadami bo'yicha bajarish"""
         user_data = context.user_data
         text = update.message.text
 
@@ -318,15 +1845,14 @@ class PaymentBot:
                     context.user_data['step'] = 'group'
                     
                     # Guruhlar ro'yxatini ko'rsatish
-                    groups = db.collection("groups").stream()
+                    groups = await self.groups.all()
                     group_text = "📱 GURUHNI TANLANG\n\n"
                     
                     group_count = 0
                     for group in groups:
-                        data = group.to_dict()
                         group_count += 1
-                        group_text += f"{group_count}. {data['title']}\n"
-                        group_text += f"   🆔 ID: {data['group_id']}\n\n"
+                        group_text += f"{group_count}. {group.title}\n"
+                        group_text += f"   🆔 ID: {group.group_id}\n\n"
                     
                     if group_count == 0:
                         group_text = "❌ Guruhlar topilmadi!\n\n"
@@ -352,8 +1878,8 @@ class PaymentBot:
                     group_id = int(text)
                     
                     # Guruh mavjudligini tekshirish
-                    group = db.collection("groups").document(str(group_id)).get()
-                    if not group.exists:
+                    group_data = await self.groups.get(group_id)
+                    if group_data is None:
                         await update.message.reply_text(
                             "❌ Bu guruh topilmadi!\n\n"
                             "Iltimos, mavjud guruh ID sini kiriting."
@@ -364,13 +1890,8 @@ class PaymentBot:
                     name = context.user_data.get('student_name')
                     phone = context.user_data.get('student_phone')
                     
-                    # Username olish
-                    username = None
-                    try:
-                        user_info = await context.bot.get_chat(user_id)
-                        username = user_info.username
-                    except:
-                        pass
+                    # Username keshdan (bo'lmasa fonda aniqlanadi)
+                    username = self.usernames.cached(user_id)
                     
                     student_data = {
                         "user_id": user_id,
@@ -384,16 +1905,18 @@ class PaymentBot:
                         "status": "active"
                     }
                     
-                    db.collection("students").document(str(user_id)).set(student_data)
+                    await self.students.add(user_id, student_data)
+                    self.stats.track(user_id, None)
+                    if username is None:
+                        self.spawn(self.update_usernames([Student(**student_data)]))
                     
-                    group_data = group.to_dict()
                     await update.message.reply_text(
                         f"✅ O'quvchi muvaffaqiyatli qo'shildi!\n\n"
                         f"👤 Ism: {name}\n"
                         f"🆔 Telegram ID: {user_id}\n"
                         f"📱 Telefon: {phone}\n"
-                        f"📱 Guruh: {group_data['title']}\n"
-                        f"{'🔗 Username: @' + username if username else '⚠️ Username topilmadi'}"
+                        f"📱 Guruh: {group_data.title}\n"
+                        f"{'🔗 Username: @' + username if username else '⏳ Username fonda aniqlanadi'}"
                     )
                     
                     context.user_data.clear()
@@ -406,25 +1929,27 @@ class PaymentBot:
         # To'lov belgilash jarayoni
         elif user_data.get('action') == 'mark_payment':
             if user_data.get('step') == 'select_student':
+                # Bir nechta "ID kun" qatori - ommaviy belgilash
+                lines = [line for line in text.splitlines() if line.strip()]
+                if len(lines) > 1 or len(text.split()) == 2:
+                    await self.mark_payments_bulk(update, lines)
+                    context.user_data.clear()
+                    return
+                
                 try:
                     user_id = int(text)
                     
                     # O'quvchi mavjudligini tekshirish
-                    student = db.collection("students").document(str(user_id)).get()
-                    if student.exists:
+                    student = await self.students.get(user_id)
+                    if student is not None:
                         context.user_data['payment_user_id'] = user_id
                         context.user_data['step'] = 'payment_days'
                         
-                        data = student.to_dict()
-                        group_id = data.get('group_id')
-                        group_name = "Belgilanmagan"
-                        if group_id:
-                            group = db.collection("groups").document(str(group_id)).get()
-                            if group.exists:
-                                group_name = group.to_dict()['title']
+                        group_titles = await self.groups.titles()
+                        group_name = group_titles.get(student.group_id, "Belgilanmagan")
                         
                         await update.message.reply_text(
-                            f"👤 {data['name']}\n"
+                            f"👤 {student.name}\n"
                             f"🆔 ID: {user_id}\n"
                             f"📱 Guruh: {group_name}\n\n"
                             f"📅 Necha kunlik to'lov?\n\n"
@@ -441,45 +1966,32 @@ class PaymentBot:
             elif user_data.get('step') == 'payment_days':
                 try:
                     days = int(text)
+                    if not MIN_PAYMENT_DAYS <= days <= MAX_PAYMENT_DAYS:
+                        await update.message.reply_text(
+                            f"❌ Kun {MIN_PAYMENT_DAYS}..{MAX_PAYMENT_DAYS} oralig'ida bo'lishi kerak!\n\n"
+                            "Misol: 30"
+                        )
+                        return
                     user_id = context.user_data.get('payment_user_id')
                     
-                    student_ref = db.collection("students").document(str(user_id))
-                    student = student_ref.get()
+                    student_data = await self.students.get(user_id)
                     
-                    if student.exists:
+                    if student_data is not None:
                         now = datetime.now(timezone.utc)
-                        next_payment = now + timedelta(days=days)
+                        fields = payment_fields(days, now)
+                        next_payment = fields["next_payment"]
                         
-                        student_ref.update({
-                            "last_payment": now,
-                            "next_payment": next_payment,
-                            "payment_days": days,
-                            "status": "paid"
-                        })
+                        # O'quvchi hujjati va to'lovlar tarixi bitta batchda
+                        await self.payments.record([(student_data, fields)])
                         
-                        # Scheduler
-                        if self.scheduler is None:
-                            self.scheduler = AsyncIOScheduler()
-                            self.scheduler.start()
-                        
-                        try:
-                            self.scheduler.remove_job(f"reminder_{user_id}")
-                        except:
-                            pass
-                        
-                        self.scheduler.add_job(
-                            self.send_reminder,
-                            'date',
-                            run_date=next_payment,
-                            args=[context.application, user_id],
-                            id=f"reminder_{user_id}"
-                        )
+                        self.stats.track(user_id, next_payment, now)
                         
-                        student_data = student.to_dict()
+                        # Scheduler
+                        self.schedule_reminder(user_id, next_payment)
                         
                         await update.message.reply_text(
                             f"✅ TO'LOV MUVAFFAQIYATLI BELGILANDI!\n\n"
-                            f"👤 O'quvchi: {student_data['name']}\n"
+                            f"👤 O'quvchi: {student_data.name}\n"
                             f"🆔 ID: {user_id}\n"
                             f"📅 To'lov sanasi: {now.strftime('%d.%m.%Y')}\n"
                             f"⏰ Keyingi to'lov: {next_payment.strftime('%d.%m.%Y')}\n"
@@ -499,50 +2011,261 @@ class PaymentBot:
                 try:
                     group_id = int(text)
                     
+                    # Barcha guruhlarga
+                    if group_id == 0:
+                        await update.message.reply_text("⏳ Barcha guruhlar uchun eslatmalar tayyorlanmoqda...")
+                        report = MessageStream(update.message.reply_text)
+                        for line in await self.remind_all_groups():
+                            await report.write(line)
+                        await report.flush()
+                        context.user_data.clear()
+                        return
+                    
                     # Guruh mavjudligini tekshirish
-                    group = db.collection("groups").document(str(group_id)).get()
-                    if not group.exists:
+                    group_data = await self.groups.get(group_id)
+                    if group_data is None:
                         await update.message.reply_text(
                             "❌ Bu guruh topilmadi!\n\n"
                             "Iltimos, mavjud guruh ID sini kiriting."
                         )
                         return
                     
-                    group_data = group.to_dict()
-                    await self.send_group_reminder(update, context, group_id, group_data['title'])
+                    await self.send_group_reminder(update, context, group_id, group_data.title)
                     context.user_data.clear()
                     
                 except ValueError:
                     await update.message.reply_text("❌ Faqat raqam kiriting!")
 
-    async def send_group_reminder(self, update: Update, context: ContextTypes.DEFAULT_TYPE, group_id: int, group_title: str):
-        """Tanlangan guruhga to'lov eslatmasi"""
-        await update.message.reply_text(f"⏳ {group_title} guruhi uchun eslatmalar tayyorlanmoqda...")
+    async def mark_payments_bulk(self, update: Update, lines):
+        """Ko'p to'lovlarni bitta xabardan belgilash ("ID kun" qatorlari)"""
+        payments = {}
+        errors = []
+        for line_no, line in enumerate(lines, 1):
+            parts = line.split()
+            try:
+                if len(parts) != 2:
+                    raise ValueError
+                user_id, days = int(parts[0]), int(parts[1])
+            except ValueError:
+                errors.append(f"{line_no}-qator: \"{line.strip()}\" - format xato")
+                continue
+            if not MIN_PAYMENT_DAYS <= days <= MAX_PAYMENT_DAYS:
+                errors.append(
+                    f"{line_no}-qator: \"{line.strip()}\" - kun {MIN_PAYMENT_DAYS}..{MAX_PAYMENT_DAYS} oralig'ida bo'lishi kerak"
+                )
+                continue
+            if user_id in payments:
+                errors.append(f"{line_no}-qator: \"{line.strip()}\" - takrorlangan ID")
+                continue
+            payments[user_id] = days
+        
+        # Barcha o'quvchilarni bitta so'rov bilan tekshirish
+        found = await self.students.get_many(payments)
+        for user_id in payments:
+            if user_id not in found:
+                errors.append(f"🆔 {user_id} - bazada topilmadi")
         
-        # Faqat shu guruhga tegishli o'quvchilarni olish
-        students = db.collection("students").where("group_id", "==", group_id).stream()
         now = datetime.now(timezone.utc)
+        updates = [(user_id, payment_fields(days, now)) for user_id, days in payments.items() if user_id in found]
         
-        # Barcha o'quvchilarni kategoriyalarga ajratish
+        # Barcha yangilanishlar va to'lovlar tarixi batch bilan
+        if updates:
+            await self.payments.record([(found[user_id], fields) for user_id, fields in updates])
+        
+        report = MessageStream(update.message.reply_text)
+        await report.write(
+            "✅ TO'LOVLAR BELGILANDI\n"
+            "━━━━━━━━━━━━━━━━━━━━\n\n"
+        )
+        for user_id, fields in updates:
+            self.stats.track(user_id, fields["next_payment"], now)
+            self.schedule_reminder(user_id, fields["next_payment"])
+            await report.write(
+                f"👤 {found[user_id].name} ({user_id})\n"
+                f"   ⏰ {fields['next_payment'].strftime('%d.%m.%Y')} - {fields['payment_days']} kun\n"
+            )
+        
+        if errors:
+            await report.write("\n❌ XATOLAR:\n")
+            for error in errors:
+                await report.write(f"{error}\n")
+        
+        await report.write(
+            "━━━━━━━━━━━━━━━━━━━━\n"
+            f"📊 Belgilandi: {len(updates)} ta, xato: {len(errors)} ta"
+        )
+        await report.flush()
+
+    @tracked("import")
+    async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """CSV/Excel fayldan o'quvchilarni ommaviy qo'shish"""
+        if update.effective_chat.type in ['group', 'supergroup']:
+            return
+        
+        if update.effective_user.id != ADMIN_ID:
+            return
+        
+        document = update.message.document
+        filename = document.file_name or ""
+        if not filename.lower().endswith((".csv", ".xlsx")):
+            await update.message.reply_text("❌ Faqat .csv yoki .xlsx fayl qabul qilinadi!")
+            return
+        
+        await update.message.reply_text("⏳ Fayl o'qilmoqda...")
+        context.user_data.clear()
+        
+        try:
+            telegram_file = await document.get_file()
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, os.path.basename(filename))
+                await telegram_file.download_to_drive(path)
+                added, errors = await self.import_students(path, filename)
+        except Exception as e:
+            logger.error(f"Fayldan importda xato: {e}")
+            await update.message.reply_text(f"❌ Faylni o'qib bo'lmadi!\n\nXato: {e}")
+            return
+        
+        report = MessageStream(update.message.reply_text)
+        await report.write(
+            "📥 IMPORT NATIJASI\n"
+            "━━━━━━━━━━━━━━━━━━━━\n\n"
+            f"✅ Qo'shildi: {added} ta\n"
+            f"❌ Xato: {len(errors)} ta\n"
+        )
+        if errors:
+            await report.write("\n")
+            for error in errors:
+                await report.write(f"{error}\n")
+        await report.flush()
+
+    async def import_students(self, path, filename):
+        """Fayl qatorlarini tekshirib, 500 tadan batch bilan yozish: (qo'shildi, xatolar)"""
+        group_titles = await self.groups.titles()
+        now = datetime.now(timezone.utc)
+        
+        async def commit(rows):
+            # Mavjud o'quvchilar qayta yozilmaydi (to'lov holati va eslatmasi saqlanib qoladi)
+            existing = await self.students.get_many([user_id for _, user_id, _ in rows])
+            chunk = []
+            for line_no, user_id, data in rows:
+                if user_id in existing:
+                    errors.append(f"{line_no}-qator: {user_id} ID bazada allaqachon mavjud")
+                    continue
+                data["username"] = self.usernames.cached(user_id)
+                chunk.append((user_id, data))
+            if not chunk:
+                return 0
+            await self.students.add_many(chunk)
+            for user_id, _ in chunk:
+                self.stats.track(user_id, None, now)
+            # Usernamelar fonda, tezlik cheklovi bilan aniqlanadi
+            self.spawn(self.update_usernames([Student(**data) for _, data in chunk]))
+            return len(chunk)
+        
+        added = 0
+        errors = []
+        rows = []
+        seen = set()
+        # 1-qator sarlavha, ma'lumotlar 2-qatordan boshlanadi
+        for line_no, row in enumerate(read_roster_rows(path, filename), 2):
+            if not any(row.values()):
+                continue
+            try:
+                user_id, data = parse_import_row(row, group_titles, now)
+            except ValueError as e:
+                errors.append(f"{line_no}-qator: {e}")
+                continue
+            if user_id in seen:
+                errors.append(f"{line_no}-qator: {user_id} ID faylda takrorlangan")
+                continue
+            seen.add(user_id)
+            rows.append((line_no, user_id, data))
+            
+            if len(rows) >= BATCH_LIMIT:
+                added += await commit(rows)
+                rows = []
+        
+        if rows:
+            added += await commit(rows)
+        
+        return added, errors
+
+    @tracked("export")
+    async def export_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/export [csv|xlsx] - o'quvchilar ro'yxatini fayl sifatida yuborish"""
+        if update.effective_user.id != ADMIN_ID:
+            return
+        
+        if update.effective_chat.type in ['group', 'supergroup']:
+            return
+        
+        file_format = context.args[0].lower() if context.args else "csv"
+        if file_format not in ("csv", "xlsx"):
+            await update.message.reply_text("❌ Format: /export csv yoki /export xlsx")
+            return
+        
+        await self.export_students(update, file_format)
+
+    async def export_students(self, update: Update, file_format):
+        """O'quvchilarni oqim bilan vaqtinchalik faylga yozib, hujjat sifatida yuborish"""
+        workbook = None
+        if file_format == "xlsx":
+            try:
+                from openpyxl import Workbook
+            except ImportError:
+                await update.message.reply_text("❌ Excel uchun openpyxl o'rnatilmagan. /export csv dan foydalaning.")
+                return
+            workbook = Workbook(write_only=True)
+        
+        await update.message.reply_text("⏳ Eksport tayyorlanmoqda...")
+        
+        group_titles = await self.groups.titles()
+        now = datetime.now(timezone.utc)
+        filename = f"oquvchilar_{now.strftime('%Y%m%d')}.{file_format}"
+        
+        count = 0
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, filename)
+            
+            # Sahifalab o'qiladi - xotirada bir vaqtda faqat bitta sahifa turadi
+            if workbook is not None:
+                sheet = workbook.create_sheet("O'quvchilar")
+                sheet.append(list(EXPORT_COLUMNS))
+                async for data in self.students.iter_all():
+                    sheet.append(export_row(data, group_titles, now))
+                    count += 1
+                workbook.save(path)
+            else:
+                with open(path, "w", newline="", encoding="utf-8-sig") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(EXPORT_COLUMNS)
+                    async for data in self.students.iter_all():
+                        writer.writerow(export_row(data, group_titles, now))
+                        count += 1
+            
+            with open(path, "rb") as f:
+                await update.message.reply_document(
+                    document=f,
+                    filename=filename,
+                    caption=f"📤 O'quvchilar ro'yxati: {count} ta"
+                )
+
+    @staticmethod
+    def classify_due(students, now):
+        """Muddati yaqin o'quvchilarni kechikkan / bugun / 7 kun ichida ro'yxatlariga ajratish"""
         overdue_students = []  # Muddati o'tgan
         today_students = []     # Bugun to'lov
         week_students = []      # 7 kun ichida
-        paid_students = []      # To'lagan (7 kundan ko'p)
         
         for student in students:
-            data = student.to_dict()
-            next_payment = data.get("next_payment")
+            days_left = student.days_left(now)
             
-            if next_payment:
-                days_left = (next_payment - now).days
-                username = data.get('username')
-                user_mention = f"@{username}" if username else data['name']
-                
+            if days_left is not None:
                 student_info = {
-                    'mention': user_mention,
-                    'name': data['name'],
+                    'mention': student.mention,
+                    'name': student.name,
                     'days': days_left,
-                    'date': next_payment.strftime('%d.%m.%Y')
+                    'date': student.next_date
                 }
                 
                 if days_left < 0:
@@ -551,50 +2274,72 @@ class PaymentBot:
                     today_students.append(student_info)
                 elif days_left <= 7:
                     week_students.append(student_info)
-                else:
-                    paid_students.append(student_info)
         
-        # Har bir kategoriyani kunlar bo'yicha saralash
-        overdue_students.sort(key=lambda x: x['days'])
-        week_students.sort(key=lambda x: x['days'])
-        paid_students.sort(key=lambda x: x['days'])
+        return overdue_students, today_students, week_students
+
+    async def post_group_reminder(self, group_id, overdue_students, today_students, week_students):
+        """Eslatma xabarini guruhga yuborish (xatolik bo'lsa exception)"""
+        message = MessageStream(lambda text: self.broadcaster.send(group_id, text))
+        await message.write(
+            "📢OYLIK TO'LOV ESLATMALARI\n"
+            "━━━━━━━━━━━━━━━━━━━━\n\n"
+        )
+        
+        # Muddati o'tganlar
+        if overdue_students:
+            await message.write("🔴 MUDDATI O'TGAN:\n\n")
+            for student in overdue_students:
+                await message.write(
+                    f"▪️ {student['mention']}\n"
+                    f"   ⚠️ {abs(student['days'])} kun kechikkan\n"
+                    f"   📅 {student['date']}\n\n"
+                )
+        
+        # Bugun to'lov
+        if today_students:
+            await message.write("🟡 BUGUN TO'LOV:\n\n")
+            for student in today_students:
+                await message.write(
+                    f"▪️ {student['mention']}\n"
+                    f"   📅 {student['date']}\n\n"
+                )
+        
+        # 7 kun ichida
+        if week_students:
+            await message.write("🟠 YAQIN MUDDA (7 kun ichida):\n\n")
+            for student in week_students:
+                await message.write(
+                    f"▪️ {student['mention']}\n"
+                    f"   ⏰ {student['days']} kun qoldi\n"
+                    f"   📅 {student['date']}\n\n"
+                )
+        
+        await message.write(
+            "━━━━━━━━━━━━━━━━━━━━\n"
+            "💡 To'lovlarni o'z vaqtida amalga oshiring!"
+        )
+        await message.flush()
+
+    @tracked("send_group_reminder")
+    async def send_group_reminder(self, update: Update, context: ContextTypes.DEFAULT_TYPE, group_id: int, group_title: str):
+        """Tanlangan guruhga to'lov eslatmasi"""
+        await update.message.reply_text(f"⏳ {group_title} guruhi uchun eslatmalar tayyorlanmoqda...")
+        
+        # Faqat kechikkan va 7 kun ichida to'laydiganlarni olish (to'laganlar faqat sanaladi)
+        now = datetime.now(timezone.utc)
+        until = now + timedelta(days=8)
+        students, paid_count = await asyncio.gather(
+            self.students.due_in_group(group_id, until),
+            self.students.count_paid_in_group(group_id, until)
+        )
+        
+        # So'rov next_payment bo'yicha saralangan - ro'yxatlar ham saralangan bo'ladi
+        overdue_students, today_students, week_students = self.classify_due(students, now)
         
         # Guruhga xabar yuborish
         if overdue_students or today_students or week_students:
-            message = "📢OYLIK TO'LOV ESLATMALARI\n"
-            message += "━━━━━━━━━━━━━━━━━━━━\n\n"
-            
-            # Muddati o'tganlar
-            if overdue_students:
-                message += "🔴 MUDDATI O'TGAN:\n\n"
-                for student in overdue_students:
-                    message += f"▪️ {student['mention']}\n"
-                    message += f"   ⚠️ {abs(student['days'])} kun kechikkan\n"
-                    message += f"   📅 {student['date']}\n\n"
-            
-            # Bugun to'lov
-            if today_students:
-                message += "🟡 BUGUN TO'LOV:\n\n"
-                for student in today_students:
-                    message += f"▪️ {student['mention']}\n"
-                    message += f"   📅 {student['date']}\n\n"
-            
-            # 7 kun ichida
-            if week_students:
-                message += "🟠 YAQIN MUDDA (7 kun ichida):\n\n"
-                for student in week_students:
-                    message += f"▪️ {student['mention']}\n"
-                    message += f"   ⏰ {student['days']} kun qoldi\n"
-                    message += f"   📅 {student['date']}\n\n"
-            
-            message += "━━━━━━━━━━━━━━━━━━━━\n"
-            message += "💡 To'lovlarni o'z vaqtida amalga oshiring!"
-            
             try:
-                await context.bot.send_message(
-                    chat_id=group_id,
-                    text=message
-                )
+                await self.post_group_reminder(group_id, overdue_students, today_students, week_students)
                 
                 # Adminга hisobot
                 total = len(overdue_students) + len(today_students) + len(week_students)
@@ -617,101 +2362,149 @@ class PaymentBot:
         else:
             await update.message.reply_text(
                 f"ℹ️ {group_title} guruhida eslatish kerak bo'lgan o'quvchi yo'q.\n\n"
-                f"✅ To'lagan: {len(paid_students)} ta\n"
+                f"✅ To'lagan: {paid_count} ta\n"
                 "Barcha o'quvchilar o'z vaqtida to'lovni amalga oshirgan."
             )
 
+    async def remind_all_groups(self):
+        """Barcha guruhlarga eslatma (bitta so'rov, parallel yuborish) - admin uchun hisobot qatorlari"""
+        now = datetime.now(timezone.utc)
+        groups, students = await asyncio.gather(
+            self.groups.all(),
+            self.students.due_all(now + timedelta(days=8))
+        )
+        
+        # O'quvchilarni guruhlar bo'yicha ajratish (saralangan tartib saqlanadi)
+        by_group = {}
+        for student in students:
+            by_group.setdefault(student.group_id, []).append(student)
+        
+        async def remind(group):
+            overdue_students, today_students, week_students = self.classify_due(
+                by_group.get(group.group_id, []), now
+            )
+            total = len(overdue_students) + len(today_students) + len(week_students)
+            if total == 0:
+                return f"ℹ️ {group.title}: eslatish kerak emas\n"
+            try:
+                await self.post_group_reminder(group.group_id, overdue_students, today_students, week_students)
+                return (
+                    f"✅ {group.title}: {total} ta "
+                    f"(🔴 {len(overdue_students)} / 🟡 {len(today_students)} / 🟠 {len(week_students)})\n"
+                )
+            except Exception as e:
+                logger.error(f"Guruhga xabar yuborishda xato ({group.group_id}): {e}")
+                return f"❌ {group.title}: {str(e)[:200]}\n"
+        
+        lines = await asyncio.gather(*(remind(group) for group in groups))
+        
+        return [
+            "📨 GURUHLARGA ESLATMALAR\n━━━━━━━━━━━━━━━━━━━━\n\n",
+            *(lines or ["Guruhlar topilmadi.\n"]),
+            f"━━━━━━━━━━━━━━━━━━━━\n📊 Guruhlar: {len(groups)} ta"
+        ]
+
+    @tracked("send_reminder")
     async def send_reminder(self, application: Application, user_id: int):
         """O'quvchiga to'lov eslatmasi yuborish"""
+        report = self.reminder_report()
         try:
-            student_ref = db.collection("students").document(str(user_id))
-            student = student_ref.get()
+            student = await self.students.get(user_id)
             
-            if student.exists:
-                data = student.to_dict()
-                
-                await application.bot.send_message(
-                    chat_id=user_id,
-                    text=f"⏰ TO'LOV ESLATMASI\n\n"
-                         f"Hurmatli {data['name']},\n"
-                         f"Sizning to'lov muddatingiz tugadi!\n\n"
-                         f"📅 To'lov sanasi: Bugun\n"
-                         f"📱 Admin bilan bog'laning."
-                )
+            if student is not None:
+                await self.broadcaster.send(user_id, reminder_text(student.name), report)
                 
                 # Statusni yangilash
-                student_ref.update({"status": "overdue"})
+                await self.students.update(user_id, {"status": "overdue"})
+                self.stats.track(user_id, student.next_payment)
                 
         except Exception as e:
             logger.error(f"Eslatma yuborishda xato: {e}")
+            report.failed.append((user_id, str(e)))
+
+    def reminder_report(self):
+        """Joriy eslatmalar to'lqini hisoboti (birinchi eslatmada ochiladi, kechikish bilan yuboriladi)"""
+        if self._reminder_report is None:
+            self._reminder_report = DeliveryReport()
+            self.spawn(self.flush_reminder_report())
+        return self._reminder_report
+
+    async def flush_reminder_report(self):
+        """Bir xil vaqtga to'g'ri kelgan eslatmalar uchun adminga bitta hisobot"""
+        await asyncio.sleep(REMINDER_REPORT_DELAY)
+        report, self._reminder_report = self._reminder_report, None
+        await self.notify_admin(report.summary("⏰ TO'LOV ESLATMALARI"))
 
     async def show_students_for_payment_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """To'lov belgilash uchun o'quvchilar ro'yxati"""
-        students = db.collection("students").stream()
-        
-        text = "💰 TO'LOV BELGILASH\n\n"
-        text += "O'quvchilar ro'yxati:\n\n"
+        text, reply_markup, total = await self.render_students_page("pay")
         
-        count = 0
-        for student in students:
-            data = student.to_dict()
-            count += 1
-            
-            group_name = "Guruhsiz"
-            group_id = data.get('group_id')
-            if group_id:
-                group = db.collection("groups").document(str(group_id)).get()
-                if group.exists:
-                    group_name = group.to_dict()['title']
-            
-            text += f"{count}. {data['name']}\n"
-            text += f"   🆔 ID: {data['user_id']}\n"
-            text += f"   📱 {data.get('phone', 'N/A')}\n"
-            text += f"   📱 Guruh: {group_name}\n\n"
+        await update.message.reply_text(text, reply_markup=reply_markup)
         
-        if count == 0:
-            text = "❌ O'quvchilar ro'yxati bo'sh!\n\nAvval o'quvchi qo'shing."
-        else:
-            text += "━━━━━━━━━━━━━━━━━━━━\n"
-            text += "O'quvchining Telegram ID sini kiriting:"
-        
-        await update.message.reply_text(text)
-        
-        if count > 0:
+        if total > 0:
             context.user_data['action'] = 'mark_payment'
             context.user_data['step'] = 'select_student'
 
     async def list_students_text(self, update: Update):
         """O'quvchilar ro'yxati"""
-        students = db.collection("students").stream()
+        text, reply_markup, _ = await self.render_students_page("list")
+        await update.message.reply_text(text, reply_markup=reply_markup)
+
+    @tracked("page")
+    async def handle_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Ro'yxat sahifalarini almashtirish"""
+        query = update.callback_query
+        await query.answer()
         
-        text = "📋 O'QUVCHILAR RO'YXATI\n"
-        text += "━━━━━━━━━━━━━━━━━━━━\n\n"
+        if update.effective_user.id != ADMIN_ID:
+            return
         
-        count = 0
-        for student in students:
-            data = student.to_dict()
-            count += 1
+        view, direction, cursor, offset = query.data.split(":")
+        if direction == "next":
+            text, reply_markup, _ = await self.render_students_page(view, after=int(cursor), offset=int(offset))
+        else:
+            text, reply_markup, _ = await self.render_students_page(view, before=int(cursor), offset=int(offset))
+        
+        await query.edit_message_text(text, reply_markup=reply_markup)
+
+    async def render_students_page(self, view, after=None, before=None, offset=0):
+        """O'quvchilar ro'yxatining bitta sahifasi: (matn, tugmalar, jami)"""
+        (students, has_prev, has_next), total, group_titles = await asyncio.gather(
+            self.students.page(after=after, before=before),
+            self.students.count(),
+            self.groups.titles()
+        )
+        if before is not None:
+            offset = max(0, offset - len(students))
+        
+        if view == "pay":
+            text = "💰 TO'LOV BELGILASH\n\n"
+            text += "O'quvchilar ro'yxati:\n\n"
+        else:
+            text = "📋 O'QUVCHILAR RO'YXATI\n"
+            text += "━━━━━━━━━━━━━━━━━━━━\n\n"
+        
+        now = datetime.now(timezone.utc)
+        for count, student in enumerate(students, offset + 1):
+            group_name = group_titles.get(student.group_id, "Guruhsiz")
             
-            status_emoji = "✅" if data.get("status") == "paid" else "⚠️"
-            next_payment = data.get("next_payment")
-            next_date = next_payment.strftime("%d.%m.%Y") if next_payment else "Belgilanmagan"
+            if view == "pay":
+                text += f"{count}. {student.name}\n"
+                text += f"   🆔 ID: {student.user_id}\n"
+                text += f"   📱 {student.phone or 'N/A'}\n"
+                text += f"   📱 Guruh: {group_name}\n\n"
+                continue
             
-            group_name = "Guruhsiz"
-            group_id = data.get('group_id')
-            if group_id:
-                group = db.collection("groups").document(str(group_id)).get()
-                if group.exists:
-                    group_name = group.to_dict()['title']
+            status_emoji = "✅" if student.status == "paid" else "⚠️"
             
-            text += f"{status_emoji} {data['name']}\n"
-            text += f"   🆔 ID: {data['user_id']}\n"
-            text += f"   📱 {data.get('phone', 'N/A')}\n"
+            text += f"{status_emoji} {student.name}\n"
+            text += f"   🆔 ID: {student.user_id}\n"
+            text += f"   📱 {student.phone or 'N/A'}\n"
             text += f"   📱 Guruh: {group_name}\n"
-            text += f"   📅 Keyingi to'lov: {next_date}\n"
+            text += f"   📅 Keyingi to'lov: {student.next_date or 'Belgilanmagan'}\n"
             
-            if next_payment:
-                days_left = (next_payment - datetime.now(timezone.utc)).days
+            days_left = student.days_left(now)
+            if days_left is not None:
                 if days_left < 0:
                     text += f"   🔴 {abs(days_left)} kun kechikkan\n"
                 elif days_left == 0:
@@ -721,45 +2514,59 @@ class PaymentBot:
             
             text += "\n"
         
-        if count == 0:
-            text += "Ro'yxat bo'sh"
+        if total == 0:
+            if view == "pay":
+                text = "❌ O'quvchilar ro'yxati bo'sh!\n\nAvval o'quvchi qo'shing."
+            else:
+                text += "Ro'yxat bo'sh"
+            return text, None, total
+        
+        text += "━━━━━━━━━━━━━━━━━━━━\n"
+        if view == "pay":
+            text += "O'quvchining Telegram ID sini kiriting:\n"
+            text += "(Bir nechta to'lov: har qatorga \"ID kun\", masalan \"123456789 30\")\n"
         else:
-            text += f"━━━━━━━━━━━━━━━━━━━━\n"
-            text += f"📊 Jami: {count} ta o'quvchi"
+            text += f"📊 Jami: {total} ta o'quvchi\n"
+        if students:
+            text += f"📄 {offset + 1}-{offset + len(students)} / {total}"
         
-        await update.message.reply_text(text)
+        # Sahifalash tugmalari (cursor - sahifa chetidagi o'quvchi ID si)
+        buttons = []
+        if has_prev and students:
+            buttons.append(InlineKeyboardButton(
+                "⬅️ Oldingi", callback_data=f"{view}:prev:{students[0].user_id}:{offset}"
+            ))
+        if has_next and students:
+            buttons.append(InlineKeyboardButton(
+                "Keyingi ➡️", callback_data=f"{view}:next:{students[-1].user_id}:{offset + len(students)}"
+            ))
+        reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+        
+        return text, reply_markup, total
 
     async def show_days_remaining_text(self, update: Update):
         """Qolgan kunlarni ko'rsatish"""
-        students = db.collection("students").stream()
-        
-        text = "⏰ TO'LOVGA QOLGAN KUNLAR\n"
-        text += "━━━━━━━━━━━━━━━━━━━━\n\n"
+        # Eng yaqin muddatlar Firestoreda saralangan holda keladi
+        students, total, group_titles = await asyncio.gather(
+            self.students.upcoming(DAYS_REMAINING_LIMIT),
+            self.students.count_with_next_payment(),
+            self.groups.titles()
+        )
         
         now = datetime.now(timezone.utc)
-        student_list = []
         
-        for student in students:
-            data = student.to_dict()
-            next_payment = data.get("next_payment")
-            
-            if next_payment:
-                days_left = (next_payment - now).days
-                student_list.append((data, days_left))
+        report = MessageStream(update.message.reply_text)
+        await report.write(
+            "⏰ TO'LOVGA QOLGAN KUNLAR\n"
+            "━━━━━━━━━━━━━━━━━━━━\n\n"
+        )
         
-        # Kunlar bo'yicha saralash (kamdan ko'pga)
-        student_list.sort(key=lambda x: x[1])
-        
-        if not student_list:
-            text += "Hech kimga to'lov belgilanmagan"
+        if not students:
+            await report.write("Hech kimga to'lov belgilanmagan")
         else:
-            for data, days_left in student_list:
-                group_name = "Guruhsiz"
-                group_id = data.get('group_id')
-                if group_id:
-                    group = db.collection("groups").document(str(group_id)).get()
-                    if group.exists:
-                        group_name = group.to_dict()['title']
+            for student in students:
+                days_left = student.days_left(now)
+                group_name = group_titles.get(student.group_id, "Guruhsiz")
                 
                 if days_left < 0:
                     emoji = "🔴"
@@ -774,16 +2581,31 @@ class PaymentBot:
                     emoji = "🟢"
                     status = f"{days_left} kun qoldi"
                 
-                text += f"{emoji} {data['name']}\n"
-                text += f"   📱 {data.get('phone', 'N/A')}\n"
-                text += f"   📱 Guruh: {group_name}\n"
-                text += f"   📅 {data.get('next_payment').strftime('%d.%m.%Y')}\n"
-                text += f"   ⏱ {status}\n\n"
+                await report.write(
+                    f"{emoji} {student.name}\n"
+                    f"   📱 {student.phone or 'N/A'}\n"
+                    f"   📱 Guruh: {group_name}\n"
+                    f"   📅 {student.next_date}\n"
+                    f"   ⏱ {status}\n\n"
+                )
             
-            text += "━━━━━━━━━━━━━━━━━━━━\n"
-            text += f"📊 Jami: {len(student_list)} ta o'quvchi"
+            footer = "━━━━━━━━━━━━━━━━━━━━\n"
+            if total > len(students):
+                footer += f"📊 Eng yaqin {len(students)} ta ko'rsatildi, jami: {total} ta o'quvchi"
+            else:
+                footer += f"📊 Jami: {total} ta o'quvchi"
+            await report.write(footer)
         
-        await update.message.reply_text(text)
+        await report.flush()
+
+
+def allowed_updates(application):
+    """Ro'yxatdan o'tgan handlerlar ishlatadigan update turlari (tahrirlar, reaksiyalar va h.k. olinmaydi)"""
+    update_types = set()
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            update_types.update(HANDLER_UPDATE_TYPES.get(type(handler), Update.ALL_TYPES))
+    return sorted(update_types)
 
 
 def main():
@@ -793,24 +2615,49 @@ def main():
     
     if not TOKEN:
         logger.error("BOT_TOKEN topilmadi! .env faylini tekshiring.")
-        return
+        sys.exit(1)
+    
+    started = time.perf_counter()
     
-    # Bot obyektini yaratish
-    bot = PaymentBot()
+    # Firebase faqat shu yerda ishga tushiriladi (import paytida emas)
+    try:
+        client = init_firestore()
+        logger.info("✅ Firebase ulanishi muvaffaqiyatli amalga oshirildi.")
+    except Exception as e:
+        logger.error(f"❌ Firebase ulanishida xato: {e}")
+        sys.exit(1)
+    firestore_ready = time.perf_counter()
+    
+    # Bot obyektini yaratish (scheduler post_init da guruhlar bilan parallel yaratiladi)
+    global payment_bot
+    bot = payment_bot = PaymentBot(client)
     
     # Application yaratish
-    application = Application.builder().token(TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(TELEGRAM_BASE_URL)
+        .base_file_url(TELEGRAM_BASE_FILE_URL)
+        .concurrent_updates(ChatOrderedUpdateProcessor())
+        .post_init(bot.post_init)
+        .post_shutdown(bot.post_shutdown)
+        .build()
+    )
     
     # Command handlers
     application.add_handler(CommandHandler("start", bot.start))
     application.add_handler(CommandHandler("setgroup", bot.set_group))
+    application.add_handler(CommandHandler("export", bot.export_command))
+    
+    # Ro'yxat sahifalari
+    application.add_handler(CallbackQueryHandler(bot.handle_page_callback, pattern=r"^(list|pay):(prev|next):"))
     
     # Message handlers
     application.add_handler(MessageHandler(
         filters.TEXT & ~filters.COMMAND & filters.Regex(
             r"^(➕ O'quvchi qo'shish|💰 To'lov belgilash|📋 O'quvchilar ro'yxati|"
             r"⏰ Qolgan kunlar|📨 Guruhga to'lovlarni eslatish|📊 Statistika|"
-            r"📱 Guruhlar ro'yxati|⚙️ Joriy guruhni o'rnatish)$"
+            r"📱 Guruhlar ro'yxati|⚙️ Joriy guruhni o'rnatish|📤 Eksport)$"
         ),
         bot.handle_button_text
     ))
@@ -820,9 +2667,28 @@ def main():
         bot.handle_message
     ))
     
+    # CSV/Excel fayldan import
+    application.add_handler(MessageHandler(filters.Document.ALL, bot.handle_document))
+    
     # Botni ishga tushirish
-    logger.info("Bot ishga tushdi...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    update_types = allowed_updates(application)
+    logger.info(
+        f"🚀 Ishga tushish: Firebase {firestore_ready - started:.2f} s, "
+        f"jami {time.perf_counter() - started:.2f} s"
+    )
+    if WEBHOOK_URL:
+        logger.info(f"Bot webhook rejimida ishga tushdi ({WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH})...")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=update_types
+        )
+    else:
+        logger.info("Bot ishga tushdi...")
+        application.run_polling(allowed_updates=update_types)
 
 
 if __name__ == "__main__":